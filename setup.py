@@ -53,6 +53,5 @@ setup(
         "PyGObject>=3.42",
         "PyYAML>=6.0",
         "requests>=2.26",
-        "schema>=0.7",
     ],
 )
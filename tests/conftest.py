@@ -0,0 +1,27 @@
+"""Contains fixtures shared between tests."""
+
+import pytest
+from twitchgamenotify import clock
+from twitchgamenotify.twitch_api import TwitchApi
+from .fakes import FakeSession
+
+
+@pytest.fixture
+def make_twitch_api():
+    """Return a function making a TwitchApi around a FakeSession."""
+
+    def make(respond):
+        return TwitchApi("id", "secret", session=FakeSession(respond))
+
+    return make
+
+
+@pytest.fixture
+def virtual_clock():
+    """Swap in a virtual clock starting at time zero."""
+    virtual = clock.VirtualClock(0)
+    clock.set_clock(virtual)
+
+    yield virtual
+
+    clock.set_clock(clock.SystemClock())
@@ -0,0 +1,50 @@
+"""Contains stand-ins for the network used by tests."""
+
+
+class FakeResponse:
+    """A stand-in for a requests.models.Response."""
+
+    def __init__(self, json_data, status_code=200, headers=None):
+        """Record what the response contains."""
+        self.json_data = json_data
+        self.status_code = status_code
+        self.headers = headers if headers is not None else {}
+
+    def json(self):
+        """Return the response's JSON."""
+        return self.json_data
+
+
+class FakeSession:
+    """A stand-in for a requests.Session which answers from a function.
+
+    Every URL requested is recorded in urls.
+    """
+
+    def __init__(self, respond):
+        """Set up the session.
+
+        Arg:
+            respond: A function taking a URL and returning the JSON
+                data (or a FakeResponse) to answer a GET of it with.
+        """
+        self.respond = respond
+        self.headers = {}
+        self.urls = []
+
+    def post(self, url, **kwargs):
+        """Answer an access token request."""
+        return FakeResponse({"access_token": "token"})
+
+    def get(self, url, **kwargs):
+        """Answer a GET with the respond function."""
+        self.urls.append(url)
+        response = self.respond(url)
+
+        if isinstance(response, FakeResponse):
+            return response
+
+        return FakeResponse(response)
+
+    def close(self):
+        """Do nothing, like closing a real session."""
@@ -0,0 +1,115 @@
+"""Contains tests for validating config files."""
+
+import pytest
+from twitchgamenotify.configuration import (
+    ConfigFileInvalid,
+    validate_config,
+)
+
+
+def minimal_config(**settings):
+    """Return a valid config with some settings added or replaced."""
+    config_dict = {
+        "query-period": 60,
+        "twitch-api-client-id": "id",
+        "twitch-api-client-secret": "secret",
+        "ignore-502-errors-one-shot": False,
+        "ignore-502-errors-persistant": True,
+    }
+    config_dict.update(settings)
+
+    return config_dict
+
+
+def validation_errors(config_dict, config_path=None):
+    """Return the errors validating a config raises."""
+    with pytest.raises(ConfigFileInvalid) as excinfo:
+        validate_config(config_dict, config_path)
+
+    return excinfo.value.errors
+
+
+def test_validate_config_fills_in_defaults():
+    """Left out streamers and games come back empty."""
+    config_dict = validate_config(minimal_config())
+
+    assert config_dict["streamers"] == {}
+    assert config_dict["games"] == {}
+
+
+def test_validate_config_reports_every_error():
+    """Every problem is reported, not just the first."""
+    config_dict = minimal_config(
+        **{
+            "query-period": 0,
+            "streamers": {"a": {"include": ["/(/"]}, "b": {}},
+            "colour": "blue",
+        }
+    )
+    del config_dict["twitch-api-client-id"]
+
+    assert sorted(validation_errors(config_dict)) == [
+        "config: colour: unknown setting",
+        "config: query-period: must be a positive number",
+        "config: streamers.a.include[0]: invalid regular expression",
+        "config: streamers.b.include: missing",
+        "config: twitch-api-client-id: missing",
+    ]
+
+
+def test_validate_config_not_a_mapping():
+    """Configs which aren't mappings are invalid."""
+    assert validation_errors(["a"]) == ["config: config: must be a mapping"]
+
+
+def test_include_streamers(tmp_path):
+    """Streamers in included files are merged in."""
+    (tmp_path / "more.yaml").write_text("b:\n  include: ['*']\n")
+    config_dict = validate_config(
+        minimal_config(
+            **{
+                "streamers": {"a": {"include": ["*"]}},
+                "include-streamers": ["*.yaml"],
+            }
+        ),
+        str(tmp_path / "config.yaml"),
+    )
+
+    assert list(config_dict["streamers"]) == ["a", "b"]
+
+
+@pytest.mark.parametrize(
+    "contents", ["- a: {include: ['*']}\n", "just a string\n"]
+)
+def test_include_streamers_not_a_mapping(tmp_path, contents):
+    """Included files which aren't mappings are reported."""
+    path = tmp_path / "more.yaml"
+    path.write_text(contents)
+
+    assert validation_errors(
+        minimal_config(**{"include-streamers": ["more.yaml"]}),
+        str(tmp_path / "config.yaml"),
+    ) == ["%s: streamers: must be a mapping" % path]
+
+
+def test_include_streamers_errors_reported_with_config_errors(tmp_path):
+    """Errors in the config and included files are reported together."""
+    (tmp_path / "more.yaml").write_text("a:\n  include: ['*']\nb: {}\n")
+    config_path = str(tmp_path / "config.yaml")
+
+    assert validation_errors(
+        minimal_config(
+            **{
+                "query-period": -1,
+                "streamers": {"a": {"include": ["*"]}},
+                "include-streamers": ["more.yaml", "missing.yaml"],
+            }
+        ),
+        config_path,
+    ) == [
+        "%s: query-period: must be a positive number" % config_path,
+        "%s: include-streamers[1]: no such file" % config_path,
+        "%s: streamers.b.include: missing" % (tmp_path / "more.yaml"),
+        "%s: streamers.a: already given in %s"
+        % (tmp_path / "more.yaml", config_path),
+    ]
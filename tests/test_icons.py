@@ -0,0 +1,107 @@
+"""Contains tests for notification icons."""
+
+import time
+from twitchgamenotify.icons import IconCache, IconFetcher
+
+
+class IconTwitchApi:
+    """Looks up image URLs the way Twitch does, with lowercase logins."""
+
+    def get_profile_image_urls(self, streamer_logins):
+        """Return an image URL for each streamer."""
+        return {s.lower(): "https://cdn/%s.png" % s for s in streamer_logins}
+
+    def get_box_art_urls(self, game_ids, width, height):
+        """Return an image URL for each game."""
+        return {
+            g: "https://cdn/%s-%dx%d.jpg" % (g, width, height)
+            for g in game_ids
+        }
+
+
+def wait_for(condition):
+    """Wait for the fetching thread to make a condition true."""
+    deadline = time.monotonic() + 5
+
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_cache_evicts_least_recently_used(tmp_path, virtual_clock):
+    """Images are evicted least recently used first once over the cap."""
+    cache = IconCache(str(tmp_path), max_bytes=10)
+
+    cache.store("a", "https://cdn/a.png", None, b"12345")
+    virtual_clock.sleep(1)
+    cache.store("b", "https://cdn/b.png", "etag", b"12345")
+    virtual_clock.sleep(1)
+    cache.get("a")
+    virtual_clock.sleep(1)
+    cache.store("c", "https://cdn/c.png", None, b"12345")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == str(tmp_path / "a.png")
+    assert (tmp_path / "c.png").read_bytes() == b"12345"
+
+    # The index survives a restart
+    cache.save()
+    assert IconCache(str(tmp_path)).get("c") == str(tmp_path / "c.png")
+
+
+def test_fetcher_matches_logins_ignoring_case(tmp_path, monkeypatch):
+    """Config-cased logins find the icons Twitch gives lowercase logins."""
+    fetcher = IconFetcher(IconTwitchApi(), IconCache(str(tmp_path)))
+    downloaded = []
+
+    def download(name, url):
+        downloaded.append((name, url))
+        return fetcher.cache.store(name, url, None, b"")
+
+    monkeypatch.setattr(fetcher, "_download", download)
+
+    fetcher.prefetch(streamer_logins=["MixedCase"], game_ids=["1"])
+    fetcher.close()
+
+    assert sorted(downloaded) == [
+        ("game-1", "https://cdn/1-144x192.jpg"),
+        ("streamer-mixedcase", "https://cdn/mixedcase.png"),
+    ]
+    assert fetcher.get_streamer_icon("MixedCase") == str(
+        tmp_path / "streamer-mixedcase.png"
+    )
+    assert fetcher.get_game_icon("1") == str(tmp_path / "game-1.jpg")
+
+
+def test_fetcher_refetches_evicted_icons(tmp_path, monkeypatch, virtual_clock):
+    """An icon evicted from the cache is fetched again when asked for."""
+    fetcher = IconFetcher(IconTwitchApi(), IconCache(str(tmp_path), 10))
+    downloaded = []
+
+    def download(name, url):
+        downloaded.append(name)
+        virtual_clock.sleep(1)
+        return fetcher.cache.store(name, url, None, b"12345")
+
+    monkeypatch.setattr(fetcher, "_download", download)
+
+    fetcher.prefetch(streamer_logins=["a"])
+    wait_for(lambda: fetcher.get_streamer_icon("a"))
+
+    # Only two images fit, so this evicts a's
+    fetcher.prefetch(streamer_logins=["b", "c"])
+    wait_for(lambda: fetcher.get_streamer_icon("c"))
+
+    assert not (tmp_path / "streamer-a.png").exists()
+    assert fetcher.get_streamer_icon("a") is None
+
+    wait_for(lambda: fetcher.get_streamer_icon("a"))
+    fetcher.close()
+
+    assert (tmp_path / "streamer-a.png").exists()
+    assert downloaded == [
+        "streamer-a",
+        "streamer-b",
+        "streamer-c",
+        "streamer-a",
+    ]
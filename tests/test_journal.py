@@ -0,0 +1,149 @@
+"""Contains tests for the stream transition journal."""
+
+import pytest
+from twitchgamenotify.events import StreamTransition
+from twitchgamenotify.journal import (
+    JournalIndex,
+    TransitionJournal,
+    format_transition,
+    get_journal_paths,
+    parse_duration,
+    parse_transition,
+    print_streamer_history,
+)
+
+
+def transition(time, streamer_login="a", kind="live", game_id="1"):
+    """Return a transition with a game name to match its ID."""
+    return StreamTransition(
+        time, kind, streamer_login, game_id, "Game " + game_id
+    )
+
+
+def test_format_and_parse_transition_round_trip():
+    """A formatted transition parses back to itself."""
+    line = format_transition(transition(100))
+
+    assert line == "100\tlive\ta\t1\tGame 1\n"
+    assert parse_transition(line) == transition(100)
+
+
+def test_format_transition_replaces_unsafe_characters():
+    """Tabs and newlines in game names don't break up the line."""
+    line = format_transition(StreamTransition(1, "live", "a", "1", "x\ty\nz"))
+
+    assert parse_transition(line).game_name == "x y z"
+
+
+@pytest.mark.parametrize("line", ["", "100\tlive\ta\n", "x\tlive\ta\t1\tG\n"])
+def test_parse_transition_malformed(line):
+    """Malformed lines parse to None."""
+    assert parse_transition(line) is None
+
+
+@pytest.mark.parametrize(
+    "duration, seconds",
+    [("30m", 1800), ("12h", 43200), ("1.5d", 129600), ("2w", 1209600)],
+)
+def test_parse_duration(duration, seconds):
+    """Durations parse to seconds."""
+    assert parse_duration(duration) == seconds
+
+
+@pytest.mark.parametrize("duration", ["", "7", "7y", "d"])
+def test_parse_duration_invalid(duration):
+    """Invalid durations raise ValueError."""
+    with pytest.raises(ValueError):
+        parse_duration(duration)
+
+
+def test_index_query():
+    """Queries find transitions in a half-open time range."""
+    index = JournalIndex(
+        [transition(30, "b"), transition(10), transition(20), transition(40)]
+    )
+
+    assert [t.time for t in index.query()] == [10, 20, 30, 40]
+    assert [t.time for t in index.query(since=20, until=40)] == [20, 30]
+    assert [t.time for t in index.query("a", since=15)] == [20, 40]
+    assert index.query("nobody") == []
+
+
+def test_index_last_before():
+    """The last transition strictly before a time is found."""
+    index = JournalIndex([transition(10), transition(20), transition(5, "b")])
+
+    assert index.last_before("a", 20).time == 10
+    assert index.last_before("a", 10) is None
+    assert index.last_before("nobody", 100) is None
+
+
+def test_journal_rotation(tmp_path):
+    """Journals rotate once full and can be read back in order."""
+    path = str(tmp_path / "journal.tsv")
+    journal = TransitionJournal(path, max_bytes=20, backup_count=2)
+
+    for time in range(1, 5):
+        journal.record(transition(time))
+        journal.flush()
+
+    assert get_journal_paths(path, 2) == [path + ".2", path + ".1", path]
+
+    # The oldest transition was rotated out
+    index = JournalIndex.from_journal(path, 2)
+    assert [t.time for t in index.query()] == [2, 3, 4]
+
+
+def test_index_matches_logins_ignoring_case():
+    """Streamers are found whatever case their login is given in."""
+    index = JournalIndex([transition(10, "Distortion2"), transition(20)])
+
+    assert [t.time for t in index.query("distortion2")] == [10]
+    assert index.last_before("DISTORTION2", 20).time == 10
+
+
+def test_journal_records_logins_in_lowercase(tmp_path):
+    """Logins are recorded in lowercase."""
+    path = str(tmp_path / "journal.tsv")
+    journal = TransitionJournal(path)
+
+    journal.record(transition(10, "Distortion2"))
+    journal.flush()
+
+    index = JournalIndex.from_journal(path)
+    assert [t.streamer_login for t in index.query()] == ["distortion2"]
+
+
+def test_journal_close_records_live_streamers_offline(tmp_path, virtual_clock):
+    """Closing the journal ends the sessions of streamers still live."""
+    path = str(tmp_path / "journal.tsv")
+    journal = TransitionJournal(path)
+
+    journal.record(transition(10, "a"))
+    journal.record(transition(20, "a", "game-change", "2"))
+    journal.record(transition(30, "b"))
+    journal.record(transition(40, "b", "offline", ""))
+
+    virtual_clock.advance_to(100)
+    journal.close()
+
+    index = JournalIndex.from_journal(path)
+    assert index.query("a")[-1] == StreamTransition(
+        100, "offline", "a", "", ""
+    )
+    assert [t.kind for t in index.query("b")] == ["live", "offline"]
+
+
+def test_history_ignores_time_between_runs(tmp_path, capsys, virtual_clock):
+    """Time between a run closing and the next starting isn't counted."""
+    path = str(tmp_path / "journal.tsv")
+
+    for start, end in [(0, 3600), (7200, 9000)]:
+        journal = TransitionJournal(path)
+        journal.record(transition(start, "Distortion2"))
+        virtual_clock.advance_to(end)
+        journal.close()
+
+    print_streamer_history(path, "distortion2", 0, 10000)
+
+    assert capsys.readouterr().out.endswith("  1h30m  Game 1\n")
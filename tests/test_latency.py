@@ -0,0 +1,132 @@
+"""Contains tests for detection latency measurement and tuning."""
+
+import pytest
+from twitchgamenotify.latency import (
+    LatencyTracker,
+    QueryPeriodTuner,
+    percentile,
+)
+
+
+class FakeTwitchApi:
+    """Counts requests and reports a rate limit, like TwitchApi."""
+
+    def __init__(self, limit=None, remaining=None, reset=None):
+        """Set up the rate limit to report."""
+        self.request_count = 0
+        self.ratelimit_limit = limit
+        self.ratelimit_remaining = remaining
+        self.ratelimit_reset = reset
+
+
+def record(tracker, latency, count=10):
+    """Record the same latency a few times."""
+    for _ in range(count):
+        tracker.record(tracker.started, tracker.started + latency)
+
+
+@pytest.mark.parametrize(
+    "percent, value", [(0, 1), (50, 5), (90, 9), (95, 10), (100, 10)]
+)
+def test_percentile(percent, value):
+    """Percentiles use the nearest rank."""
+    assert percentile(list(range(1, 11)), percent) == value
+
+
+def test_tracker_ignores_streams_live_before_it_started(virtual_clock):
+    """Only streams started since the tracker started are recorded."""
+    virtual_clock.advance_to(100)
+    tracker = LatencyTracker()
+
+    tracker.record(50, 150)
+    tracker.record(100, 130)
+    tracker.record(110, 130)
+
+    assert tracker.total == 2
+    assert tracker.percentiles((50, 100)) == {50: 20, 100: 30}
+
+
+def test_tracker_keeps_a_window(virtual_clock):
+    """Only the most recent latencies are kept, but all are counted."""
+    tracker = LatencyTracker(window=2)
+
+    for latency in (100, 1, 2):
+        tracker.record(0, latency)
+
+    assert len(tracker) == 2
+    assert tracker.total == 3
+    assert tracker.percentiles((100,)) == {100: 2}
+
+
+def test_tracker_summary(virtual_clock):
+    """The summary says when there's nothing to summarize."""
+    tracker = LatencyTracker()
+
+    assert tracker.summary() == "no detection latencies recorded"
+
+    tracker.record(0, 5)
+
+    assert tracker.summary() == (
+        "detection latency over the last 1 of 1 go-lives: "
+        "p50 5.0s, p90 5.0s, p95 5.0s, p99 5.0s"
+    )
+
+
+def test_tuner_speeds_up_when_too_slow(virtual_clock):
+    """The period shortens while the p95 latency is above the target."""
+    tracker = LatencyTracker()
+    tuner = QueryPeriodTuner(60, tracker, FakeTwitchApi(), 60)
+    record(tracker, 90)
+
+    assert tuner.update() == 48
+
+    # Nothing new was recorded, so nothing changes
+    assert tuner.update() == 48
+
+
+def test_tuner_slows_down_when_comfortably_fast(virtual_clock):
+    """The period lengthens while the p95 latency is well under target."""
+    tracker = LatencyTracker()
+    tuner = QueryPeriodTuner(60, tracker, FakeTwitchApi(), 60)
+    record(tracker, 10)
+
+    assert tuner.update() == 75
+
+    # But never past the maximum
+    for _ in range(10):
+        record(tracker, 10, 1)
+        tuner.update()
+
+    assert tuner.period == 240
+
+
+def test_tuner_waits_for_enough_samples(virtual_clock):
+    """The period isn't changed until there are enough latencies."""
+    tracker = LatencyTracker()
+    tuner = QueryPeriodTuner(60, tracker, FakeTwitchApi(), 60)
+    record(tracker, 90, 9)
+
+    assert tuner.update() == 60
+
+
+def test_tuner_respects_rate_limit(virtual_clock):
+    """The period never gets so short as to use up the rate limit."""
+    tracker = LatencyTracker()
+    twitch_api = FakeTwitchApi(limit=800)
+    tuner = QueryPeriodTuner(60, tracker, twitch_api, 60)
+    record(tracker, 90)
+
+    # 400 requests a cycle may only use half of 800 points a minute
+    twitch_api.request_count = 400
+
+    assert tuner.update() == 60
+
+
+def test_tuner_waits_for_rate_limit_reset(virtual_clock):
+    """The next cycle waits for the rate limit to refill if need be."""
+    twitch_api = FakeTwitchApi(limit=800, remaining=10, reset=100)
+    tuner = QueryPeriodTuner(5, LatencyTracker(), twitch_api, 60)
+    twitch_api.request_count = 20
+
+    assert tuner.update() == 100
+    assert tuner.period == 5
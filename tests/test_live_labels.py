@@ -0,0 +1,19 @@
+"""Contains tests for the live streamer labels."""
+
+from twitchgamenotify.live_labels import LiveLabels
+
+
+def test_update_returns_only_changes():
+    """Only streamers whose labels changed are returned."""
+    labels = LiveLabels()
+
+    assert labels.update(
+        {"a": ("A", "Celeste"), "b": ("B", "Celeste"), "c": None}
+    ) == [("a", "A — Celeste"), ("b", "B — Celeste")]
+
+    # Unchanged, changed game, offline, and left out
+    assert labels.update(
+        {"a": ("A", "Celeste"), "b": ("B", "Hades"), "c": None}
+    ) == [("b", "B — Hades")]
+    assert labels.update({"a": None}) == [("a", None)]
+    assert labels.update({"a": None, "b": ("B", "Hades")}) == []
@@ -0,0 +1,144 @@
+"""Contains tests for the game and title matchers."""
+
+import pytest
+from twitchgamenotify import matching
+from twitchgamenotify.matching import (
+    GameFilter,
+    GameMatcher,
+    KeywordAutomaton,
+    TitleFilter,
+    compile_streamer_filters,
+    is_valid_game_pattern,
+    parse_regex_pattern,
+)
+
+
+@pytest.mark.parametrize(
+    "pattern, parsed",
+    [
+        ("/souls/i", ("souls", "i")),
+        ("/a/b/", ("a/b", "")),
+        ("/souls/x", None),
+        ("/souls", None),
+        ("Dark Souls", None),
+    ],
+)
+def test_parse_regex_pattern(pattern, parsed):
+    """Regex patterns are split into their regex and flags."""
+    assert parse_regex_pattern(pattern) == parsed
+
+
+def test_is_valid_game_pattern():
+    """Only regex patterns which don't compile are invalid."""
+    assert is_valid_game_pattern("/souls/i")
+    assert is_valid_game_pattern("[PROTOTYPE")
+    assert not is_valid_game_pattern("/(souls/")
+
+
+@pytest.mark.parametrize(
+    "patterns, game_id, game_name, matches",
+    [
+        (["*"], "1", "Anything", True),
+        (["Dark Souls"], "1", "Dark Souls", True),
+        (["Dark Souls"], "1", "Dark Souls II", False),
+        (["1"], "1", "Dark Souls", True),
+        (["Dark Souls*"], "1", "Dark Souls II", True),
+        (["Dark Souls*"], "1", "The Dark Souls", False),
+        (["[PROTOTYPE]"], "1", "[PROTOTYPE]", True),
+        (["/^resident evil/i"], "1", "Resident Evil 4", True),
+        (["/^resident evil/"], "1", "Resident Evil 4", False),
+        (["/^4/", "Dark*"], "42", "Minecraft", True),
+    ],
+)
+def test_game_matcher(patterns, game_id, game_name, matches):
+    """Games match names, IDs, globs, and regexes."""
+    assert GameMatcher(patterns).matches(game_id, game_name) is matches
+
+
+def test_game_matcher_duplicate_group_names():
+    """Regexes reusing a group name don't clash."""
+    matcher = GameMatcher(["/(?P<x>souls)/i", "/(?P<x>ring)/", "Dark*"])
+
+    assert matcher.matches("1", "Dark Souls")
+    assert matcher.matches("1", "Elden ring")
+    assert not matcher.matches("1", "Minecraft")
+
+
+def test_game_matcher_backreferences():
+    """Backreferences still refer to their own regex's groups."""
+    matcher = GameMatcher(["/(a)x/", "/(b)\\1/"])
+
+    assert matcher.matches("1", "bb")
+    assert matcher.matches("1", "ax")
+    assert not matcher.matches("1", "ba")
+
+
+def test_game_filter_exclude():
+    """Excluded games aren't allowed even if they're included."""
+    game_filter = GameFilter(["Dark*"], ["Dark Souls II"])
+
+    assert game_filter.allows("1", "Dark Souls")
+    assert not game_filter.allows("2", "Dark Souls II")
+    assert not game_filter.allows("3", "Minecraft")
+
+
+def test_game_filter_cache_evicts_least_recently_used(monkeypatch):
+    """A full cache forgets only the least recently used game."""
+    monkeypatch.setattr(matching, "GAME_MATCH_CACHE_SIZE", 2)
+    game_filter = GameFilter(["*"])
+
+    game_filter.allows("1", "One")
+    game_filter.allows("2", "Two")
+    game_filter.allows("1", "One")
+    game_filter.allows("3", "Three")
+
+    assert list(game_filter._cache) == ["1", "3"]
+
+
+def test_keyword_automaton_overlapping_keywords():
+    """Keywords found inside or overlapping others are all found."""
+    automaton = KeywordAutomaton([("he", 1), ("she", 2), ("hers", 4)])
+
+    assert automaton.search("ushers") == 7
+    assert automaton.search("she") == 3
+    assert automaton.search("xyz") == 0
+
+
+def test_keyword_automaton_stop_flags():
+    """Searching stops once the stop flags are found."""
+    automaton = KeywordAutomaton([("a", 1), ("b", 2)])
+
+    assert automaton.search("ab", stop_flags=1) == 1
+    assert automaton.search("ab") == 3
+
+
+@pytest.mark.parametrize(
+    "include, exclude, title, allowed",
+    [
+        ([], [], "Anything", True),
+        (["speedrun"], [], "SPEEDRUN any%", True),
+        (["speedrun"], [], "Casual", False),
+        ([], ["rerun"], "Rerun of yesterday", False),
+        (["speedrun"], ["rerun"], "Speedrun rerun", False),
+    ],
+)
+def test_title_filter(include, exclude, title, allowed):
+    """Titles need an included keyword and no excluded keywords."""
+    assert TitleFilter(include, exclude).allows(title) is allowed
+
+
+def test_compile_streamer_filters_shares_filters():
+    """Streamers with identical lists share filters."""
+    filters = compile_streamer_filters(
+        {
+            "a": {"include": ["*"]},
+            "b": {"include": ["*"]},
+            "c": {"include": ["*"], "exclude-title": ["rerun"]},
+        },
+        include_title=["speedrun"],
+    )
+
+    assert filters["a"].games is filters["b"].games is filters["c"].games
+    assert filters["a"].titles is filters["b"].titles
+    assert filters["a"].titles is not filters["c"].titles
+    assert not filters["a"].titles.allows("Casual")
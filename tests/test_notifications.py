@@ -0,0 +1,207 @@
+"""Contains tests for processing notifications."""
+
+import collections
+from twitchgamenotify import clock
+from twitchgamenotify.events import Notification, StreamTransition
+from twitchgamenotify.latency import LatencyTracker
+from twitchgamenotify.matching import compile_streamer_filters
+from twitchgamenotify.notifications import (
+    get_watched_games,
+    process_notifications,
+    update_games_state,
+)
+
+
+class SlowTwitchApi:
+    """Answers that every streamer is offline, taking a while to do so."""
+
+    def __init__(self, virtual_clock, seconds_per_request):
+        """Set up how long each request takes."""
+        self.virtual_clock = virtual_clock
+        self.seconds_per_request = seconds_per_request
+        self.queried = []
+
+    def get_online_stream_info(self, streamer_login_name):
+        """Answer that a streamer is offline."""
+        self.queried.append(streamer_login_name)
+        self.virtual_clock.sleep(self.seconds_per_request)
+
+        return dict(
+            live=False,
+            title="",
+            user_display_name="",
+            game_name="",
+            game_id="",
+            started_at=None,
+        )
+
+
+class ScriptedTwitchApi:
+    """Answers with each of a list of streams in turn."""
+
+    def __init__(self, streams):
+        """Set up the streams to answer with.
+
+        Arg:
+            streams: A list of dictionaries of stream information to
+                use in place of a live stream's defaults.
+        """
+        self.streams = iter(streams)
+
+    def get_online_stream_info(self, _):
+        """Answer with the next stream."""
+        info = dict(
+            live=True,
+            title="",
+            user_display_name="A",
+            game_name="Game",
+            game_id="1",
+            started_at=0,
+        )
+        info.update(next(self.streams))
+
+        return info
+
+
+def run_cycles(twitch_api, count, **kwargs):
+    """Run query cycles a minute apart, returning each cycle's events.
+
+    This needs the virtual clock.
+    """
+    cycles = []
+
+    for _ in range(count):
+        events = []
+        process_notifications(
+            twitch_api=twitch_api,
+            sinks=None,
+            ignore_502s=False,
+            events_callback=events.append,
+            **kwargs,
+        )
+        cycles.append(events)
+        clock.sleep(60)
+
+    return cycles
+
+
+def test_deadline_resumes_where_last_cycle_stopped(virtual_clock):
+    """Streamers skipped at the deadline are queried first next cycle."""
+    streamers = compile_streamer_filters(
+        {login: {"include": ["*"]} for login in "abcde"}
+    )
+    streamers_order = collections.deque(streamers)
+    twitch_api = SlowTwitchApi(virtual_clock, 10)
+
+    for _ in range(2):
+        process_notifications(
+            streamers,
+            twitch_api,
+            sinks=None,
+            ignore_502s=False,
+            streamers_previous_game=dict.fromkeys(streamers, ""),
+            streamers_previous_title_match=dict.fromkeys(streamers, False),
+            deadline=virtual_clock.monotonic() + 25,
+            streamers_order=streamers_order,
+        )
+
+    assert twitch_api.queried == ["a", "b", "c", "d", "e", "a"]
+    assert list(streamers_order) == ["b", "c", "d", "e", "a"]
+
+
+def test_update_games_state():
+    """Only streamers newly seen streaming a game are new."""
+    games_state = {"a": "1", "b": "1", "c": "2", "d": "2"}
+
+    new_streamers = update_games_state(
+        games_state, {"a": "1", "b": "2", "e": "1"}, complete_games=["1"]
+    )
+
+    assert new_streamers == ["b", "e"]
+
+    # Streamers of games which weren't seen in full are kept
+    assert games_state == {"a": "1", "b": "2", "c": "2", "d": "2", "e": "1"}
+
+
+def test_update_games_state_forgets_streamers_gone_offline():
+    """Streamers who stop streaming a fully seen game are new again later."""
+    games_state = {}
+
+    assert update_games_state(games_state, {"a": "1"}, ["1"]) == ["a"]
+    assert update_games_state(games_state, {}, ["1"]) == []
+    assert games_state == {}
+    assert update_games_state(games_state, {"a": "1"}, ["1"]) == ["a"]
+
+
+def test_title_starting_to_match_notifies_again(virtual_clock):
+    """A title passing the title filter again notifies again."""
+    streamers = compile_streamer_filters(
+        {"a": {"include": ["*"], "include-title": ["speedrun"]}}
+    )
+    streamers_previous_game = dict.fromkeys(streamers, "")
+    streamers_previous_title_match = dict.fromkeys(streamers, False)
+    titles = ["chill", "speedrun", "chill", "speedrun any%"]
+
+    cycles = run_cycles(
+        ScriptedTwitchApi([{"title": title} for title in titles]),
+        len(titles),
+        streamers=streamers,
+        streamers_previous_game=streamers_previous_game,
+        streamers_previous_title_match=streamers_previous_title_match,
+    )
+
+    # Going live with a non-matching title records the transition but
+    # doesn't notify; after that, only the title matching again does
+    assert [
+        [
+            event.kind if isinstance(event, StreamTransition) else event.title
+            for event in events
+        ]
+        for events in cycles
+    ] == [["live"], ["speedrun"], [], ["speedrun any%"]]
+    assert streamers_previous_game == {"a": "1"}
+    assert streamers_previous_title_match == {"a": True}
+
+
+def test_latency_only_for_streams_started_while_watching(virtual_clock):
+    """Streams already live when we started have no latency."""
+    streamers = compile_streamer_filters({"a": {"include": ["*"]}})
+    virtual_clock.advance_to(1000)
+    latency_tracker = LatencyTracker()
+
+    # Live since before we started, then offline, then live again
+    cycles = run_cycles(
+        ScriptedTwitchApi(
+            [{"started_at": 0}, {"live": False}, {"started_at": 1100}]
+        ),
+        3,
+        streamers=streamers,
+        streamers_previous_game=dict.fromkeys(streamers, ""),
+        streamers_previous_title_match=dict.fromkeys(streamers, False),
+        latency_tracker=latency_tracker,
+    )
+
+    assert [
+        event.latency
+        for events in cycles
+        for event in events
+        if isinstance(event, Notification)
+    ] == [None, 20]
+    assert latency_tracker.total == 1
+
+
+def test_get_watched_games():
+    """Games are looked up by name, leaving out ones Twitch doesn't know."""
+
+    class GameTwitchApi:
+        """Knows of one game."""
+
+        def get_game_ids(self, game_names):
+            """Return the IDs of the games Twitch knows of."""
+            return {g: ["1"] for g in game_names if g == "Celeste"}
+
+    assert get_watched_games(GameTwitchApi(), {}) == {}
+    assert get_watched_games(
+        GameTwitchApi(),
+        {"Celeste": {"min-viewers": 5}, "Nonexistent": {"min-viewers": 1}},
+    ) == {"1": 5}
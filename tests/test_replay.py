@@ -0,0 +1,92 @@
+"""Contains tests for recording and replaying Twitch API responses."""
+
+import json
+import os
+import pytest
+from twitchgamenotify.constants import (
+    TRANSITION_GAME_CHANGE,
+    TRANSITION_LIVE,
+    TRANSITION_OFFLINE,
+)
+from twitchgamenotify.events import Notification, StreamTransition
+from twitchgamenotify.matching import compile_streamer_filters
+from twitchgamenotify.notifications import process_notifications
+from twitchgamenotify.replay import (
+    CassetteExhausted,
+    ReplaySession,
+    redact_body,
+    redact_url,
+    run_replay,
+)
+from twitchgamenotify.twitch_api import TwitchApi
+
+CASSETTE_PATH = os.path.join(
+    os.path.dirname(__file__), "data", "session.jsonl"
+)
+
+
+def test_redact_url():
+    """The token URL's query string (with the secret) is dropped."""
+    token_url = "https://id.twitch.tv/oauth2/token"
+
+    assert redact_url(token_url + "?client_secret=hunter2") == token_url
+    assert redact_url("https://example.com/?a=b") == "https://example.com/?a=b"
+
+
+def test_redact_body():
+    """Access tokens are replaced in response bodies."""
+    assert "hunter2" not in redact_body(
+        json.dumps({"access_token": "hunter2"})
+    )
+    assert redact_body("not json") == "not json"
+
+
+def test_replay_session_exhausted():
+    """Requests with no recorded responses left raise."""
+    session = ReplaySession(CASSETTE_PATH)
+
+    with pytest.raises(CassetteExhausted):
+        session.get("https://api.twitch.tv/helix/streams?user_login=carol")
+
+
+def test_replay_cassette(virtual_clock):
+    """Replaying a cassette makes the same decisions at the same times."""
+    session = ReplaySession(CASSETTE_PATH)
+    virtual_clock.advance_to(session.start)
+
+    streamers = {
+        "alice": {"include": ["Dark Souls*"]},
+        "bob": {"include": ["*"], "include-title": ["speedrun"]},
+    }
+    events = []
+
+    cycles = run_replay(
+        process_notifications,
+        session.start,
+        session.query_period,
+        streamers=compile_streamer_filters(streamers),
+        twitch_api=TwitchApi("id", "secret", session=session),
+        sinks=None,
+        ignore_502s=False,
+        streamers_previous_game=dict.fromkeys(streamers, ""),
+        streamers_previous_title_match=dict.fromkeys(streamers, False),
+        events_callback=events.append,
+    )
+
+    assert cycles == 5
+    assert [
+        (e.time, e.streamer_login, e.game_id)
+        for e in events
+        if isinstance(e, Notification)
+    ] == [(1061, "alice", "410"), (1061, "bob", "226")]
+    assert [
+        (e.time, e.kind, e.streamer_login)
+        for e in events
+        if isinstance(e, StreamTransition)
+    ] == [
+        (1001, TRANSITION_LIVE, "bob"),
+        (1061, TRANSITION_LIVE, "alice"),
+        (1181, TRANSITION_GAME_CHANGE, "alice"),
+        (1181, TRANSITION_OFFLINE, "bob"),
+        (1241, TRANSITION_OFFLINE, "alice"),
+    ]
@@ -0,0 +1,74 @@
+"""Contains tests for the query cycle runner."""
+
+import os
+import subprocess
+import sys
+import textwrap
+import threading
+import time
+from twitchgamenotify.scheduling import CycleRunner
+
+
+def test_run_cycle_passes_deadline(virtual_clock):
+    """Cycles are given a deadline relative to when they started."""
+    virtual_clock.sleep(100)
+    runner = CycleRunner(deadline=30)
+    deadlines = []
+    done = threading.Event()
+
+    def cycle(deadline, **kwargs):
+        deadlines.append((deadline, kwargs))
+        done.set()
+
+    assert runner.run_cycle(cycle, x=1)
+    assert done.wait(5)
+    runner.shutdown()
+
+    assert deadlines == [(130, {"x": 1})]
+
+
+def test_run_cycle_skips_while_previous_running():
+    """A cycle due while the last is still running is skipped."""
+    runner = CycleRunner()
+    release = threading.Event()
+
+    def cycle(deadline):
+        release.wait(5)
+
+    assert runner.run_cycle(cycle)
+    assert not runner.run_cycle(cycle)
+
+    release.set()
+    runner.shutdown()
+
+
+def test_exit_does_not_wait_for_running_cycle():
+    """Exiting while a cycle is running doesn't wait for it to finish."""
+    script = textwrap.dedent(
+        """
+        import atexit, sys, threading, time
+        from twitchgamenotify.scheduling import CycleRunner
+
+        runner = CycleRunner()
+        atexit.register(runner.shutdown)
+        started = threading.Event()
+
+        def cycle(deadline):
+            started.set()
+            time.sleep(60)
+
+        runner.run_cycle(cycle)
+        started.wait(5)
+        sys.exit(0)
+        """
+    )
+
+    start = time.monotonic()
+    subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        check=True,
+        timeout=30,
+    )
+
+    assert time.monotonic() - start < 10
@@ -0,0 +1,119 @@
+"""Contains tests for the notification sinks."""
+
+import json
+import threading
+import pytest
+from twitchgamenotify import sinks as sinks_module
+from twitchgamenotify.events import Notification
+from twitchgamenotify.sinks import (
+    JsonLinesSink,
+    NotificationSink,
+    SinkDispatcher,
+)
+
+
+class RecordingSink(NotificationSink):
+    """Records each batch sent to it."""
+
+    def __init__(self):
+        """Start with nothing sent."""
+        self.batches = []
+        self.sent = threading.Event()
+
+    def send(self, notifications):
+        """Record a batch."""
+        self.batches.append(notifications)
+        self.sent.set()
+
+
+class BlockingSink(NotificationSink):
+    """Blocks sending until released."""
+
+    def __init__(self):
+        """Start blocked."""
+        self.release = threading.Event()
+
+    def send(self, notifications):
+        """Wait to be released."""
+        self.release.wait()
+
+
+def notification(streamer_login):
+    """Return a notification about a streamer."""
+    return Notification(0.0, streamer_login, streamer_login, "", "1", "G")
+
+
+def test_sink_needs_send():
+    """Sinks which don't implement send can't be made."""
+
+    class IncompleteSink(NotificationSink):
+        """Doesn't implement send."""
+
+    with pytest.raises(TypeError):
+        IncompleteSink()
+
+
+def test_dispatcher_batches_by_cycle():
+    """Overlapping cycles each send their own batch."""
+    sink = RecordingSink()
+    dispatcher = SinkDispatcher([sink])
+
+    first = dispatcher.start_cycle()
+    second = dispatcher.start_cycle()
+    dispatcher.notify(notification("a"), first)
+    dispatcher.notify(notification("b"), second)
+    dispatcher.notify(notification("c"), first)
+
+    dispatcher.end_cycle(second)
+    assert sink.sent.wait(5)
+    dispatcher.close()
+
+    assert [[n.streamer_login for n in b] for b in sink.batches] == [
+        ["b"],
+        ["a", "c"],
+    ]
+
+
+def test_dispatcher_skips_empty_batches():
+    """Cycles without notifications send nothing."""
+    sink = RecordingSink()
+    dispatcher = SinkDispatcher([sink])
+
+    dispatcher.end_cycle(dispatcher.start_cycle())
+    dispatcher.close()
+
+    assert sink.batches == []
+
+
+def test_dispatcher_close_with_full_queue(monkeypatch):
+    """Closing doesn't hang on a sink whose queue is full."""
+    monkeypatch.setattr(sinks_module, "SINK_QUEUE_SIZE", 1)
+    monkeypatch.setattr(sinks_module, "SINK_CLOSE_TIMEOUT", 0.1)
+    sink = BlockingSink()
+    dispatcher = SinkDispatcher([sink])
+
+    # One batch is being sent and the next fills the queue
+    for _ in range(2):
+        cycle = dispatcher.start_cycle()
+        dispatcher.notify(notification("a"), cycle)
+        dispatcher.end_cycle(cycle)
+
+    closer = threading.Thread(target=dispatcher.close)
+    closer.start()
+    closer.join(5)
+    sink.release.set()
+
+    assert not closer.is_alive()
+
+
+def test_json_lines_sink(tmp_path):
+    """Notifications are appended as JSON lines."""
+    path = tmp_path / "notifications.jsonl"
+    sink = JsonLinesSink(str(path))
+
+    sink.send([notification("a"), notification("b")])
+    sink.close()
+
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [line["streamer_login"] for line in lines] == ["a", "b"]
+    assert lines[0]["time"] == "1970-01-01T00:00:00+00:00"
@@ -0,0 +1,134 @@
+"""Contains tests for the trace buffer."""
+
+import json
+import os
+import sys
+import threading
+import time
+from twitchgamenotify import trace as trace_module
+from twitchgamenotify.trace import TraceBuffer
+
+
+def read_kinds(path):
+    """Return the kinds of the events in a dump."""
+    with open(path, "r", encoding="utf-8") as dump_file:
+        return [json.loads(line)["kind"] for line in dump_file]
+
+
+def test_buffer_keeps_last_cycles(tmp_path):
+    """Only the events of the last few cycles are kept."""
+    buffer = TraceBuffer(cycles=2, capacity=100)
+    buffer.record("token")
+
+    for cycle in range(3):
+        buffer.start_cycle()
+        buffer.record("request", cycle=cycle)
+
+    path = str(tmp_path / "trace.jsonl")
+    buffer.dump(path)
+
+    assert read_kinds(path) == ["cycle-start", "request"] * 2
+
+    with open(path, "r", encoding="utf-8") as dump_file:
+        assert [json.loads(line).get("cycle") for line in dump_file] == [
+            None,
+            1,
+            None,
+            2,
+        ]
+
+
+def test_buffer_caps_events_per_cycle(tmp_path):
+    """A cycle only keeps its most recent events."""
+    buffer = TraceBuffer(cycles=2, capacity=2)
+    buffer.start_cycle()
+
+    for kind in ("a", "b", "c"):
+        buffer.record(kind)
+
+    path = str(tmp_path / "trace.jsonl")
+    buffer.dump(path)
+
+    assert read_kinds(path) == ["b", "c"]
+
+
+def test_dump_in_background(tmp_path, monkeypatch):
+    """Dumps can be handed off to a thread, even holding the dump lock."""
+    monkeypatch.setattr(trace_module, "TRACE_DIR", str(tmp_path))
+    buffer = TraceBuffer()
+    buffer.record("token")
+
+    # As if a signal arrived mid-dump
+    with buffer._dump_lock:
+        thread = buffer.dump_in_background("signal")
+
+    thread.join(5)
+
+    (path,) = tmp_path.glob("trace-*-signal.jsonl")
+    assert read_kinds(str(path)) == ["token"]
+
+
+def test_auto_dump_rate_limited(monkeypatch, virtual_clock):
+    """Automatic dumps happen at most once per interval."""
+    buffer = TraceBuffer()
+    reasons = []
+    monkeypatch.setattr(buffer, "dump_to_trace_dir", reasons.append)
+
+    buffer.auto_dump("first")
+    virtual_clock.sleep(1)
+    buffer.auto_dump("second")
+    virtual_clock.sleep(trace_module.TRACE_AUTO_DUMP_INTERVAL)
+    buffer.auto_dump("third")
+
+    assert reasons == ["first", "third"]
+
+
+def test_disabled_buffer_records_and_dumps_nothing(tmp_path, monkeypatch):
+    """A disabled buffer ignores events and never dumps on its own."""
+    monkeypatch.setattr(trace_module, "TRACE_DIR", str(tmp_path))
+    buffer = TraceBuffer(enabled=False)
+
+    buffer.start_cycle()
+    buffer.record("request")
+    buffer.auto_dump("error")
+
+    path = str(tmp_path / "trace.jsonl")
+    buffer.dump(path)
+
+    assert read_kinds(path) == []
+    assert list(tmp_path.glob("trace-*")) == []
+
+
+def test_dump_while_recording(tmp_path):
+    """Dumping doesn't trip over events recorded at the same time."""
+    buffer = TraceBuffer(cycles=2, capacity=100000)
+    stop = threading.Event()
+
+    def record():
+        while not stop.is_set():
+            buffer.start_cycle()
+
+            for _ in range(10000):
+                buffer.record("request")
+
+    # Switch threads as often as possible, so events get recorded
+    # midway through dumps
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    thread = threading.Thread(target=record)
+    thread.start()
+
+    try:
+        until = time.monotonic() + 2
+
+        while time.monotonic() < until:
+            buffer.dump(os.devnull)
+
+        path = str(tmp_path / "trace.jsonl")
+        buffer.dump(path)
+    finally:
+        stop.set()
+        thread.join(5)
+        sys.setswitchinterval(switch_interval)
+
+    assert set(read_kinds(path)) == {"cycle-start", "request"}
@@ -0,0 +1,85 @@
+"""Contains tests for the Twitch API client."""
+
+import urllib.parse
+
+
+def stream_data(user_login, viewer_count, game_id="1"):
+    """Return a stream object as the Twitch API sends it."""
+    return dict(
+        user_login=user_login,
+        user_name=user_login.capitalize(),
+        game_id=game_id,
+        game_name="Game " + game_id,
+        title="Title",
+        started_at="2021-02-19T18:03:02Z",
+        viewer_count=viewer_count,
+    )
+
+
+def test_iter_game_streams_url(make_twitch_api):
+    """The game streams URL asks for one page of the game's streams."""
+    twitch_api = make_twitch_api(lambda url: {"data": []})
+
+    assert list(twitch_api.iter_game_streams("32 982", 0)) == []
+
+    url = urllib.parse.urlsplit(twitch_api.session.urls[0])
+    assert url.path.endswith("/streams")
+    assert urllib.parse.parse_qs(url.query) == {
+        "game_id": ["32 982"],
+        "first": ["100"],
+    }
+
+
+def test_iter_game_streams_stops_below_min_viewers(make_twitch_api):
+    """No more pages are requested once streams fall below the minimum."""
+    twitch_api = make_twitch_api(
+        lambda url: {
+            "data": [stream_data("a", 50), stream_data("b", 5)],
+            "pagination": {"cursor": "next"},
+        }
+    )
+
+    streams = list(twitch_api.iter_game_streams("1", 10))
+
+    assert [s["user_login"] for s in streams] == ["a"]
+    assert streams[0]["started_at"] == 1613757782.0
+    assert len(twitch_api.session.urls) == 1
+
+
+def test_iter_game_streams_pages_with_encoded_cursor(make_twitch_api):
+    """Later pages are asked for after the (URL-encoded) cursor."""
+    pages = {
+        None: {
+            "data": [stream_data("a", 50)],
+            "pagination": {"cursor": "ab+c/=="},
+        },
+        "ab+c/==": {"data": [stream_data("b", 40)], "pagination": {}},
+    }
+
+    def respond(url):
+        query = urllib.parse.parse_qs(urllib.parse.urlsplit(url).query)
+        return pages[query.get("after", [None])[0]]
+
+    twitch_api = make_twitch_api(respond)
+    streams = list(twitch_api.iter_game_streams("1", 10))
+
+    assert [s["user_login"] for s in streams] == ["a", "b"]
+    assert twitch_api.session.urls[1].endswith("&after=ab%2Bc%2F%3D%3D")
+
+
+def test_icon_requests_not_counted(make_twitch_api):
+    """Looking up icons doesn't count towards the request count."""
+    users = {
+        "data": [{"login": "MixedCase", "profile_image_url": "https://a/b"}]
+    }
+    twitch_api = make_twitch_api(
+        lambda url: users if "/users?" in url else {"data": []}
+    )
+
+    assert twitch_api.get_profile_image_urls(["MixedCase"]) == {
+        "mixedcase": "https://a/b"
+    }
+    assert twitch_api.request_count == 0
+
+    twitch_api.get_online_stream_info("mixedcase")
+    assert twitch_api.request_count == 1
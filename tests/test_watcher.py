@@ -0,0 +1,136 @@
+"""Contains tests for using twitch-game-notify as a library."""
+
+import asyncio
+import itertools
+import os
+import subprocess
+import sys
+import pytest
+from twitchgamenotify import ConfigFileInvalid, Notification, Watcher
+from twitchgamenotify.trace import TRACE
+from .fakes import FakeSession
+
+CONFIG = {
+    "query-period": 0.01,
+    "twitch-api-client-id": "id",
+    "twitch-api-client-secret": "secret",
+    "ignore-502-errors-one-shot": False,
+    "ignore-502-errors-persistant": True,
+    "streamers": {"alice": {"include": ["Dark Souls*"]}},
+}
+
+ALICE_LIVE = {
+    "data": [
+        {
+            "user_login": "alice",
+            "user_name": "Alice",
+            "game_id": "410",
+            "game_name": "Dark Souls III",
+            "title": "hi",
+            "started_at": "2021-02-19T18:03:02Z",
+            "viewer_count": 10,
+        }
+    ]
+}
+
+
+def test_import_without_notify2():
+    """Watcher can be imported without notify2 or D-Bus."""
+    subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys; sys.modules['notify2'] = sys.modules['dbus'] = None;"
+            "from twitchgamenotify import Watcher",
+        ],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        check=True,
+    )
+
+
+def test_invalid_config():
+    """Invalid configs are rejected up front."""
+    with pytest.raises(ConfigFileInvalid):
+        Watcher(dict(CONFIG, **{"query-period": -1}))
+
+
+def test_poll_and_callbacks():
+    """Polls return and hand out events only when something changes."""
+    watcher = Watcher(CONFIG, session=FakeSession(lambda url: ALICE_LIVE))
+    called_back = []
+    watcher.add_callback(called_back.append)
+
+    events = watcher.poll()
+
+    assert [type(e).__name__ for e in events] == [
+        "StreamTransition",
+        "Notification",
+    ]
+    assert events[1].game_name == "Dark Souls III"
+    assert called_back == events
+
+    watcher.remove_callback(called_back.append)
+    assert watcher.poll() == []
+
+
+def test_poll_does_not_trace():
+    """Library use leaves tracing off unless asked for."""
+    watcher = Watcher(CONFIG, session=FakeSession(lambda url: ALICE_LIVE))
+
+    watcher.poll()
+
+    assert not TRACE.enabled
+    assert not any(list(cycle) for cycle in TRACE._cycles)
+
+
+def test_async_events():
+    """Events can be iterated over asynchronously."""
+    watcher = Watcher(CONFIG, session=FakeSession(lambda url: ALICE_LIVE))
+
+    async def first_notification():
+        async for event in watcher:
+            if isinstance(event, Notification):
+                return event
+
+        return None
+
+    try:
+        event = asyncio.run(asyncio.wait_for(first_notification(), 5))
+    finally:
+        watcher.stop(5)
+
+    assert event.streamer_login == "alice"
+
+
+def test_closing_events_stops_watcher_it_started():
+    """The watcher stops with the last iterator if that started it."""
+    # Alice goes live and offline every other poll, so there are
+    # always events
+    responses = itertools.cycle([ALICE_LIVE, {"data": []}])
+    watcher = Watcher(CONFIG, session=FakeSession(lambda url: next(responses)))
+
+    async def open_and_close_iterators():
+        iterators = [watcher.events(), watcher.events()]
+
+        for iterator in iterators:
+            await iterator.__anext__()
+
+        await iterators[0].aclose()
+        running = watcher._thread is not None
+        await iterators[1].aclose()
+
+        return running
+
+    # Closing the first iterator leaves the watcher running for the
+    # second
+    assert asyncio.run(asyncio.wait_for(open_and_close_iterators(), 5))
+    assert watcher._thread is None
+
+    # A watcher started beforehand is left running
+    watcher.start()
+
+    try:
+        asyncio.run(asyncio.wait_for(open_and_close_iterators(), 5))
+        assert watcher._thread is not None
+    finally:
+        watcher.stop(5)
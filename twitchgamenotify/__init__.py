@@ -0,0 +1,30 @@
+"""Get notified when Twitch streamers stream certain categories.
+
+Besides the twitch-game-notify command, the package can be embedded in
+other programs through Watcher, which hands out StreamTransitions and
+Notifications as they happen.
+"""
+
+import importlib
+
+# Exported names and the modules they live in. These are imported only
+# when first used, since setup.py imports the version module before any
+# dependencies are installed.
+_EXPORTS = {
+    "Notification": "twitchgamenotify.events",
+    "StreamTransition": "twitchgamenotify.events",
+    "Watcher": "twitchgamenotify.watcher",
+    "ConfigFileInvalid": "twitchgamenotify.configuration",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    """Import an exported name on first use."""
+    if name not in _EXPORTS:
+        raise AttributeError(
+            "module %r has no attribute %r" % (__name__, name)
+        )
+
+    return getattr(importlib.import_module(_EXPORTS[name]), name)
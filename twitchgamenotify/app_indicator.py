@@ -5,9 +5,11 @@ works, though.
 """
 
 import _thread  # pylint: disable=wrong-import-order
+import bisect
 import logging
 import gi
 from twitchgamenotify.constants import APP_INDICATOR_SVG_PATH
+from twitchgamenotify.live_labels import LiveLabels
 from twitchgamenotify.version import NAME, VERSION
 
 # Make sure our GTK stuff is good before loading the app indicator
@@ -18,17 +20,37 @@ except ValueError as e:
     _thread.interrupt_main()
 
 # fmt: off
-from gi.repository import Gtk # pylint: disable=wrong-import-order,wrong-import-position
+from gi.repository import GLib, Gtk # pylint: disable=wrong-import-order,wrong-import-position
 # fmt: on
 
 
 class AppIndicator:
-    """Shows a simple app indicator for the program."""
+    """Shows an app indicator listing which streamers are live."""
 
-    def __init__(self):
-        """Setup the app indicator."""
-        # Build the menu
+    def __init__(self, poll_now_callback=None):
+        """Setup the app indicator.
+
+        Arg:
+            poll_now_callback: An optional function to call (from the
+                GTK thread) when "Poll now" is selected. If None, there
+                is no "Poll now" item.
+        """
+        # Build the menu. Live streamers go at the top, sorted by login
+        # name, followed by a placeholder for when nobody is live.
         self.menu = Gtk.Menu()
+
+        self.item_nobody_live = Gtk.MenuItem("Nobody is live")
+        self.item_nobody_live.set_sensitive(False)
+        self.menu.append(self.item_nobody_live)
+        self.menu.append(Gtk.SeparatorMenuItem())
+
+        if poll_now_callback is not None:
+            item_poll_now = Gtk.MenuItem("Poll now")
+            item_poll_now.connect(
+                "activate", lambda source: poll_now_callback()
+            )
+            self.menu.append(item_poll_now)
+
         item_quit = Gtk.MenuItem("Quit")
 
         # Wrap the kill_main function
@@ -38,12 +60,80 @@ class AppIndicator:
         self.menu.append(item_quit)
         self.menu.show_all()
 
+        # Login names of the live streamers in the menu, sorted, and
+        # their menu items. Only touched from the GTK thread.
+        self._live_logins = []
+        self._live_items = {}
+
+        # The label each live streamer was last given
+        self._labels = LiveLabels()
+
         self.indicator = Gtk.StatusIcon(
             title=NAME, tooltip_text=NAME + " " + VERSION
         )
         self.indicator.set_from_file(APP_INDICATOR_SVG_PATH)
         self.indicator.connect("popup-menu", self.on_popup_menu)
 
+    def update_live_streamers(self, live_streamers):
+        """Update the menu with the latest live streamers.
+
+        This can be called from any thread. Only the streamers whose
+        labels have changed are passed on to the GTK thread, and only
+        their menu items are touched.
+
+        Arg:
+            live_streamers: A dictionary where the keys are strings
+                containing streamers' login names and the values are
+                tuples containing the streamer's display name and the
+                name of the game they're streaming if they're live, or
+                None if they're offline (see LiveLabels.update).
+        """
+        changes = self._labels.update(live_streamers)
+
+        if changes:
+            GLib.idle_add(self._apply_changes, changes)
+
+    def _apply_changes(self, changes):
+        """Apply changes to the live streamers in the menu.
+
+        Arg:
+            changes: A list of tuples containing a streamer's login name
+                and their new label, or None to remove them.
+
+        Returns:
+            False, so GLib doesn't call this again.
+        """
+        for streamer_login_name, label in changes:
+            item = self._live_items.get(streamer_login_name)
+
+            if label is None:
+                # Streamer went offline
+                self._live_logins.remove(streamer_login_name)
+                del self._live_items[streamer_login_name]
+                self.menu.remove(item)
+                item.destroy()
+            elif item is not None:
+                # Streamer changed games
+                item.set_label(label)
+            else:
+                # Streamer went live
+                position = bisect.bisect(
+                    self._live_logins, streamer_login_name
+                )
+                self._live_logins.insert(position, streamer_login_name)
+
+                item = Gtk.MenuItem(label)
+                self._live_items[streamer_login_name] = item
+                self.menu.insert(item, position)
+                item.show()
+
+        self.item_nobody_live.set_visible(not self._live_items)
+        self.indicator.set_tooltip_text(
+            "%s %s\n%d live" % (NAME, VERSION, len(self._live_items))
+        )
+
+        return False
+
     def on_popup_menu(self, icon, button, time):
         """Calls the menu popup."""
         self.menu.popup(
@@ -0,0 +1,99 @@
+"""Contains the clock used to timestamp and schedule things.
+
+Everything that needs the current time goes through this module rather
+than calling the time module directly, so that a virtual clock can be
+swapped in when replaying a recorded session.
+"""
+
+import time as _time
+
+
+class SystemClock:
+    """The real clock."""
+
+    @staticmethod
+    def time():
+        """Return the current Unix time."""
+        return _time.time()
+
+    @staticmethod
+    def monotonic():
+        """Return the value of a monotonic clock."""
+        return _time.monotonic()
+
+    @staticmethod
+    def sleep(seconds):
+        """Sleep for a number of seconds."""
+        _time.sleep(seconds)
+
+
+class VirtualClock:
+    """A clock which only moves forward when asked to."""
+
+    def __init__(self, start, speed=None):
+        """Set the clock.
+
+        Args:
+            start: A number containing the Unix time to start at.
+            speed: An optional number containing how many times faster
+                than real time the clock runs while sleeping. Defaults
+                to None, which doesn't sleep at all.
+        """
+        self._now = start
+        self.speed = speed
+
+    def time(self):
+        """Return the current virtual Unix time."""
+        return self._now
+
+    def monotonic(self):
+        """Return the current virtual Unix time."""
+        return self._now
+
+    def sleep(self, seconds):
+        """Move the clock forward by a number of seconds."""
+        if seconds <= 0:
+            return
+
+        self._now += seconds
+
+        if self.speed:
+            _time.sleep(seconds / self.speed)
+
+    def advance_to(self, when):
+        """Move the clock forward to a Unix time, if it's in the future."""
+        self.sleep(when - self._now)
+
+
+# The clock in use
+_clock = SystemClock()
+
+
+def set_clock(clock):
+    """Set the clock in use.
+
+    Arg:
+        clock: A SystemClock or VirtualClock.
+    """
+    global _clock  # pylint: disable=global-statement
+    _clock = clock
+
+
+def get_clock():
+    """Return the clock in use."""
+    return _clock
+
+
+def time():
+    """Return the current Unix time according to the clock in use."""
+    return _clock.time()
+
+
+def monotonic():
+    """Return the monotonic time according to the clock in use."""
+    return _clock.monotonic()
+
+
+def sleep(seconds):
+    """Sleep for a number of seconds according to the clock in use."""
+    _clock.sleep(seconds)
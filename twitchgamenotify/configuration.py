@@ -1,9 +1,9 @@
 """Contains configuration related functions."""
 
 import argparse
+import glob
 import os.path
 import sys
-from schema import And, Optional, Or, Schema
 import yaml
 from twitchgamenotify.constants import (
     CONFIG_FILE_NAME,
@@ -14,11 +14,26 @@ from twitchgamenotify.constants import (
     PROJECT_CONFIG_HOME,
     WARNING,
 )
+from twitchgamenotify.matching import is_valid_game_pattern
 from twitchgamenotify.version import NAME, VERSION, DESCRIPTION
 
 
+# PyYAML's C loader is much faster, but is only available when PyYAML
+# was built against LibYAML
+YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
 class ConfigFileInvalid(Exception):
-    """Raised when a config file is invalid."""
+    """Raised when a config file is invalid.
+
+    Attribute:
+        errors: A list of strings describing each problem found.
+    """
+
+    def __init__(self, errors):
+        """Store the problems found."""
+        super().__init__("\n".join(errors))
+        self.errors = errors
 
 
 class ConfigFileNotFound(Exception):
@@ -30,7 +45,7 @@ class PrintExampleConfigAction(argparse.Action):
 
     def __call__(self, parser, namespace, values, option_string=None):
         """Print example config file."""
-        with open(EXAMPLE_CONFIG_FILE_PATH, "r") as f:
+        with open(EXAMPLE_CONFIG_FILE_PATH, "r", encoding="utf-8") as f:
             print(f.read())
 
         sys.exit(0)
@@ -74,11 +89,325 @@ def find_config_file():
     raise ConfigFileNotFound
 
 
+def load_yaml_file(path):
+    """Load a YAML file, using the C loader if PyYAML was built with it.
+
+    Arg:
+        path: A string containing the path of the file to load.
+
+    Returns:
+        The loaded YAML document.
+
+    Raises:
+        ConfigFileInvalid: The file couldn't be read or isn't valid
+            YAML.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as yaml_file:
+            return yaml.load(yaml_file, Loader=YAML_LOADER)
+    except (OSError, yaml.YAMLError) as e:
+        raise ConfigFileInvalid(["%s: %s" % (path, e)]) from e
+
+
+def join_path(path, key):
+    """Return the path of a key within a setting, for error messages."""
+    if isinstance(key, int):
+        return "%s[%d]" % (path, key)
+
+    return "%s.%s" % (path, key) if path else str(key)
+
+
+def check_positive_number(value, path, errors):
+    """Check that a setting is a positive number."""
+    if (
+        not isinstance(value, (int, float))
+        or isinstance(value, bool)
+        or value <= 0
+    ):
+        errors.append((path, "must be a positive number"))
+
+
+def check_non_negative_integer(value, path, errors):
+    """Check that a setting is a non-negative integer."""
+    if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+        errors.append((path, "must be a non-negative integer"))
+
+
+def check_boolean(value, path, errors):
+    """Check that a setting is a boolean."""
+    if not isinstance(value, bool):
+        errors.append((path, "must be true or false"))
+
+
+def check_non_empty_string(value, path, errors):
+    """Check that a setting is a non-empty string."""
+    if not isinstance(value, str) or not value:
+        errors.append((path, "must be a non-empty string"))
+
+
+def check_string_list(value, path, errors):
+    """Check that a setting is a list of non-empty strings."""
+    if not isinstance(value, list):
+        errors.append((path, "must be a list"))
+        return
+
+    for index, item in enumerate(value):
+        if not isinstance(item, str) or not item:
+            errors.append(
+                (join_path(path, index), "must be a non-empty string")
+            )
+
+
+def check_game_patterns(value, path, errors):
+    """Check that a setting is a list of valid game patterns."""
+    if not isinstance(value, list):
+        errors.append((path, "must be a list"))
+        return
+
+    for index, item in enumerate(value):
+        if not isinstance(item, str) or not item:
+            errors.append(
+                (join_path(path, index), "must be a non-empty string")
+            )
+        elif not is_valid_game_pattern(item):
+            errors.append(
+                (join_path(path, index), "invalid regular expression")
+            )
+
+
+def check_settings(value, path, errors, settings):
+    """Check a mapping of settings against a table of checks.
+
+    Args:
+        value: The mapping to check.
+        path: A string containing the path of the mapping.
+        errors: A list to append (path, message) tuples to.
+        settings: A dictionary mapping setting names to (required,
+            check) tuples, where check is a function taking a value,
+            path, and list of errors.
+    """
+    if not isinstance(value, dict):
+        errors.append((path or "config", "must be a mapping"))
+        return
+
+    for key, (required, _) in settings.items():
+        if required and key not in value:
+            errors.append((join_path(path, key), "missing"))
+
+    for key, setting_value in value.items():
+        if key not in settings:
+            errors.append((join_path(path, key), "unknown setting"))
+            continue
+
+        settings[key][1](setting_value, join_path(path, key), errors)
+
+
+def check_streamer(value, path, errors):
+    """Check the settings of a single streamer."""
+    check_settings(value, path, errors, STREAMER_SETTINGS)
+
+
+def check_game(value, path, errors):
+    """Check the settings of a single game."""
+    check_settings(value, path, errors, GAME_SETTINGS)
+
+
+def check_named_mapping(value, path, errors, check_item):
+    """Check a mapping from non-empty names to settings.
+
+    Args:
+        value: The mapping to check.
+        path: A string containing the path of the mapping.
+        errors: A list to append (path, message) tuples to.
+        check_item: A function to check each item's settings with.
+    """
+    if value is None:
+        # An empty block, e.g. when everything's in included files
+        return
+
+    if not isinstance(value, dict):
+        errors.append((path, "must be a mapping"))
+        return
+
+    for name, item in value.items():
+        item_path = join_path(path, name)
+
+        if not isinstance(name, str) or not name:
+            errors.append((item_path, "name must be a non-empty string"))
+        else:
+            check_item(item, item_path, errors)
+
+
+def check_streamers(value, path, errors):
+    """Check a block of streamers."""
+    check_named_mapping(value, path, errors, check_streamer)
+
+
+def check_games(value, path, errors):
+    """Check a block of games."""
+    check_named_mapping(value, path, errors, check_game)
+
+
+# Setting name -> (whether it's required, function to check it with)
+STREAMER_SETTINGS = {
+    "include": (True, check_game_patterns),
+    "exclude": (False, check_game_patterns),
+    "include-title": (False, check_string_list),
+    "exclude-title": (False, check_string_list),
+}
+GAME_SETTINGS = {
+    "min-viewers": (True, check_non_negative_integer),
+}
+CONFIG_SETTINGS = {
+    "query-period": (True, check_positive_number),
+    "twitch-api-client-id": (True, check_non_empty_string),
+    "twitch-api-client-secret": (True, check_non_empty_string),
+    "streamers": (False, check_streamers),
+    "include-streamers": (False, check_string_list),
+    "include-title": (False, check_string_list),
+    "exclude-title": (False, check_string_list),
+    "games": (False, check_games),
+    "cycle-deadline": (False, check_positive_number),
+    "auto-tune-query-period": (False, check_boolean),
+    "target-p95-latency": (False, check_positive_number),
+    "ignore-502-errors-one-shot": (True, check_boolean),
+    "ignore-502-errors-persistant": (True, check_boolean),
+    "journal": (False, check_boolean),
+}
+
+
+def format_errors(file_path, errors):
+    """Return (path, message) error tuples as strings for a file."""
+    return ["%s: %s: %s" % (file_path, path, msg) for path, msg in errors]
+
+
+def find_included_files(config_path, patterns, errors):
+    """Find the streamer files included by a config file.
+
+    Args:
+        config_path: A string containing the path of the config file.
+        patterns: A list of strings containing paths or glob patterns,
+            relative to the config file's directory.
+        errors: A list to append (path, message) tuples to.
+
+    Returns:
+        A list of strings containing the paths of the files, in order.
+    """
+    config_dir = os.path.dirname(config_path)
+    paths = []
+
+    for index, pattern in enumerate(patterns):
+        full_pattern = os.path.join(config_dir, os.path.expanduser(pattern))
+        matches = sorted(glob.glob(full_pattern))
+
+        if not matches and not glob.has_magic(full_pattern):
+            errors.append(
+                (join_path("include-streamers", index), "no such file")
+            )
+
+        paths += [p for p in matches if p not in paths]
+
+    return paths
+
+
+def validate_config(config_dict, config_path=None):
+    """Validate settings and merge in any included streamers.
+
+    Streamers can also be listed in other files, given by the
+    include-streamers setting, which each contain a mapping of streamers
+    just like the streamers setting does. These are merged into the
+    streamers setting.
+
+    Every problem found is reported, not just the first.
+
+    Args:
+        config_dict: A dictionary containing settings, as loaded from a
+            config file. This isn't modified.
+        config_path: An optional string containing the path of the
+            config file the settings came from, which included files
+            are relative to. Defaults to None, for settings which didn't
+            come from a file, in which case included files are relative
+            to the working directory.
+
+    Returns:
+        A dictionary containing the settings, with the included
+        streamers merged in and the optional streamers and games
+        settings filled in.
+
+    Raises:
+        ConfigFileInvalid: The settings weren't valid.
+    """
+    source = config_path or "config"
+
+    errors = []
+    check_settings(config_dict, "", errors, CONFIG_SETTINGS)
+    messages = format_errors(source, errors)
+
+    # Carry on with whatever's usable to find problems in the included
+    # files too, so everything can be fixed in one go
+    if not isinstance(config_dict, dict):
+        raise ConfigFileInvalid(messages)
+
+    streamers = config_dict.get("streamers")
+    streamers = dict(streamers) if isinstance(streamers, dict) else {}
+    patterns = config_dict.get("include-streamers")
+
+    if not isinstance(patterns, list) or not all(
+        isinstance(p, str) for p in patterns
+    ):
+        patterns = []
+
+    # Merge in streamers from included files
+    streamer_sources = dict.fromkeys(streamers, source)
+    errors = []
+    included_paths = find_included_files(config_path or "", patterns, errors)
+    messages += format_errors(source, errors)
+
+    for included_path in included_paths:
+        try:
+            included_streamers = load_yaml_file(included_path)
+        except ConfigFileInvalid as e:
+            messages += e.errors
+            continue
+
+        errors = []
+        check_streamers(included_streamers, "streamers", errors)
+
+        if isinstance(included_streamers, dict):
+            for streamer in included_streamers:
+                if streamer in streamer_sources:
+                    errors.append(
+                        (
+                            join_path("streamers", streamer),
+                            "already given in %s" % streamer_sources[streamer],
+                        )
+                    )
+
+        messages += format_errors(included_path, errors)
+
+        if not errors and included_streamers:
+            streamers.update(included_streamers)
+            streamer_sources.update(
+                dict.fromkeys(included_streamers, included_path)
+            )
+
+    if messages:
+        raise ConfigFileInvalid(messages)
+
+    # Either streamers or games can be left out
+    config_dict = dict(config_dict)
+    config_dict["streamers"] = streamers
+    config_dict["games"] = config_dict.get("games") or {}
+
+    return config_dict
+
+
 def parse_config_file():
     """Find, parse, and validate a config file.
 
     Returns:
-        A dictionary containing settings in user config file.
+        A dictionary containing settings in user config file, as
+        returned by validate_config.
 
     Raises:
         ConfigFileInvalid: A config file wasn't valid.
@@ -86,32 +415,7 @@ def parse_config_file():
     # Find the config file first
     config_path = find_config_file()
 
-    # Now parse and return it - note that PyYAML doesn't come with any
-    # schema validation, which might be desirable at some point
-    with open(config_path, "r") as config_file:
-        config_dict = yaml.safe_load(config_file)
-
-    # Build the schema for the config file, and validate what we have
-    schema = Schema(
-        {
-            "query-period": And(Or(float, int), lambda x: x > 0),
-            "twitch-api-client-id": And(str, len),
-            "twitch-api-client-secret": And(str, len),
-            "streamers": {
-                And(str, len): {
-                    "include": [And(str, len)],
-                    Optional("exclude"): [And(str, len)],
-                }
-            },
-            "ignore-502-errors-one-shot": bool,
-            "ignore-502-errors-persistant": bool,
-        }
-    )
-
-    if not schema.is_valid(config_dict):
-        raise ConfigFileInvalid
-
-    return config_dict
+    return validate_config(load_yaml_file(config_path), config_path)
 
 
 def parse_runtime_args():
@@ -136,6 +440,20 @@ def parse_runtime_args():
     parser.add_argument(
         "--one-shot", action="store_true", help="query once then exit"
     )
+    parser.add_argument(
+        "--history",
+        metavar="STREAMER",
+        help="print what a streamer has streamed, according to the journal",
+    )
+    parser.add_argument(
+        "--since",
+        default="1w",
+        metavar="DURATION",
+        help=(
+            "how far back --history looks, e.g. 12h, 3d, or 2w "
+            "(default: %(default)s)"
+        ),
+    )
     parser.add_argument(
         "--no-app-indicator",
         action="store_true",
@@ -152,6 +470,46 @@ def parse_runtime_args():
         action="store_true",
         help="print to terminal (doesn't connect to D-Bus)",
     )
+    parser.add_argument(
+        "--json-lines",
+        nargs="?",
+        const="-",
+        metavar="PATH",
+        help=(
+            "also write notifications as JSON lines to a file, or to "
+            "stdout if no file is given (instead of printing them)"
+        ),
+    )
+    parser.add_argument(
+        "--webhook",
+        action="append",
+        default=[],
+        metavar="URL",
+        help="also POST notifications as JSON to a URL (can be repeated)",
+    )
+    parser.add_argument(
+        "--record",
+        metavar="CASSETTE",
+        help="record every response from the Twitch API to a file",
+    )
+    parser.add_argument(
+        "--replay",
+        metavar="CASSETTE",
+        help=(
+            "replay a recorded file instead of querying the Twitch API, "
+            "using a virtual clock"
+        ),
+    )
+    parser.add_argument(
+        "--replay-speed",
+        type=float,
+        default=0,
+        metavar="FACTOR",
+        help=(
+            "how many times faster than real time to replay, or 0 to "
+            "replay as fast as possible (default: %(default)s)"
+        ),
+    )
     parser.add_argument(
         "--version", action="version", version="%(prog)s " + VERSION
     )
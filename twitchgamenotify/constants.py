@@ -28,11 +28,59 @@ except KeyError:
         os.environ["HOME"], ".config/", "twitch-game-notify"
     )
 
+# Base of XDG data files
+try:
+    PROJECT_DATA_HOME = os.path.join(
+        os.environ["XDG_DATA_HOME"], "twitch-game-notify"
+    )
+except KeyError:
+    PROJECT_DATA_HOME = os.path.join(
+        os.environ["HOME"], ".local/share/", "twitch-game-notify"
+    )
+
+# Base of XDG state files
+try:
+    PROJECT_STATE_HOME = os.path.join(
+        os.environ["XDG_STATE_HOME"], "twitch-game-notify"
+    )
+except KeyError:
+    PROJECT_STATE_HOME = os.path.join(
+        os.environ["HOME"], ".local/state/", "twitch-game-notify"
+    )
+
+# Base of XDG cache files
+try:
+    PROJECT_CACHE_HOME = os.path.join(
+        os.environ["XDG_CACHE_HOME"], "twitch-game-notify"
+    )
+except KeyError:
+    PROJECT_CACHE_HOME = os.path.join(
+        os.environ["HOME"], ".cache/", "twitch-game-notify"
+    )
+
 
 # Config file names
 CONFIG_FILE_NAME = "config.yaml"
 
 
+# Game patterns in the config file
+GAME_PATTERN_WILDCARD = "*"
+GAME_PATTERN_REGEX_FLAGS = "i"
+GAME_MATCH_CACHE_SIZE = 4096
+
+
+# Stream transition journal
+JOURNAL_FILE_PATH = os.path.join(PROJECT_DATA_HOME, "journal.tsv")
+JOURNAL_MAX_BYTES = 4 * 1024 * 1024
+JOURNAL_BACKUP_COUNT = 5
+JOURNAL_FLUSH_INTERVAL = 30
+
+# Stream transition kinds
+TRANSITION_LIVE = "live"
+TRANSITION_OFFLINE = "offline"
+TRANSITION_GAME_CHANGE = "game"
+
+
 # Loglevel CLI options
 CRITICAL = "critical"
 ERROR = "error"
@@ -50,14 +98,79 @@ LOGLEVEL_DICT = {
 }
 
 
+# Connect and read timeouts for HTTP requests, in seconds
+HTTP_TIMEOUT = (3.05, 10)
+
+
+# Query cycles. Cycles share state, so only one runs at a time; a cycle
+# that's still going when the next one is due causes the next one to
+# be skipped.
+CYCLE_WORKERS = 1
+CYCLE_DEADLINE = 60
+WATCHDOG_INTERVAL = 10
+
+
+# Detection latency measurement and query period tuning. Latencies are
+# kept for the most recent go-live notifications. The tuner adjusts the
+# query period once it has enough latencies, keeping within a fraction
+# of the API's rate limit and a multiple of the configured period.
+LATENCY_WINDOW = 200
+TUNER_MIN_SAMPLES = 10
+TUNER_RATE_LIMIT_FRACTION = 0.5
+TUNER_MAX_PERIOD_FACTOR = 4
+TUNER_SPEED_UP = 0.8
+TUNER_SLOW_DOWN = 1.25
+DEFAULT_TARGET_P95_LATENCY = 60
+
+
+# Trace ring buffer, which keeps the events of the last few query
+# cycles (and at most so many events of each). Dumps go in the trace
+# directory; automatic dumps (after errors) happen at most once per
+# interval, in seconds.
+TRACE_CYCLES = 10
+TRACE_CYCLE_CAPACITY = 10000
+TRACE_DIR = os.path.join(PROJECT_STATE_HOME, "traces")
+TRACE_AUTO_DUMP_INTERVAL = 300
+
+
+# Recording and replaying cassettes of Twitch API responses
+CASSETTE_VERSION = 1
+REPLAY_REDACTED = "REDACTED"
+
+
+# Notification sinks
+SINK_QUEUE_SIZE = 64
+SINK_CLOSE_TIMEOUT = 5
+WEBHOOK_TIMEOUT = 5
+
+
+# Notification icons. Box art is fetched at (width, height), and icons
+# are only fetched ahead of time for up to so many streamers.
+ICON_CACHE_DIR = os.path.join(PROJECT_CACHE_HOME, "icons")
+ICON_CACHE_MAX_BYTES = 32 * 1024 * 1024
+ICON_BOX_ART_SIZE = (144, 192)
+ICON_PREFETCH_LIMIT = 1000
+
+
 # Twitch API URLs
 TWITCH_BASE_API_URL = "https://api.twitch.tv/helix"
 TWITCH_STREAM_API_URL = TWITCH_BASE_API_URL + "/streams"
+TWITCH_GAME_API_URL = TWITCH_BASE_API_URL + "/games"
+TWITCH_USER_API_URL = TWITCH_BASE_API_URL + "/users"
 TWITCH_TOKEN_API_URL = "https://id.twitch.tv/oauth2/token"
 
 
+# Format of times returned by the Twitch API (always UTC)
+TWITCH_API_TIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+# Most items the Twitch API returns (or accepts as query parameters)
+# per request
+TWITCH_API_PAGE_SIZE = 100
+
+
 # HTTP status codes
 HTTP_200_OK = 200
+HTTP_304_NOT_MODIFIED = 304
 HTTP_400_BAD_REQUEST = 400
 HTTP_401_UNAUTHORIZED = 401
 HTTP_502_BAD_GATEWAY = 502
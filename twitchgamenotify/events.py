@@ -0,0 +1,44 @@
+"""Contains the types describing what happens to a stream."""
+
+import collections
+
+
+# A change in what a streamer is doing, as seen between two queries.
+#
+# - time: a float containing the Unix time the transition was detected
+# - kind: one of the TRANSITION_* strings in constants
+# - streamer_login: a string containing the streamer's login name
+# - game_id: a string containing the game ID being streamed (empty
+#   when the transition is to offline)
+# - game_name: a string containing the name of the game being streamed
+#   (empty when the transition is to offline)
+StreamTransition = collections.namedtuple(
+    "StreamTransition",
+    ["time", "kind", "streamer_login", "game_id", "game_name"],
+)
+
+
+# A notification to send about a stream.
+#
+# - time: a float containing the Unix time the notification was made
+# - streamer_login: a string containing the streamer's login name
+# - user_display_name: a string containing the streamer's display name
+# - title: a string containing the stream's title
+# - game_id: a string containing the ID of the game being streamed
+# - game_name: a string containing the name of the game being streamed
+# - latency: a float containing how many seconds after the stream
+#   started the notification was made, if it's about the stream going
+#   live (None otherwise)
+Notification = collections.namedtuple(
+    "Notification",
+    [
+        "time",
+        "streamer_login",
+        "user_display_name",
+        "title",
+        "game_id",
+        "game_name",
+        "latency",
+    ],
+    defaults=(None,),
+)
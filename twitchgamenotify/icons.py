@@ -0,0 +1,413 @@
+"""Contains streamer avatars and game box art for notification icons.
+
+Images are kept in a size-capped cache on disk, with the least recently
+used ones evicted first. Fetching happens in a background thread: asking
+for an icon never waits on the network, and gets whatever's on disk
+(possibly nothing) until the fetch finishes. Each icon is fetched at
+most once per run, unless it's evicted from the cache; one already on
+disk from a previous run is revalidated with its ETag rather than
+downloaded again.
+"""
+
+import json
+import logging
+import os
+import queue
+import threading
+import urllib.parse
+import requests
+from twitchgamenotify import clock
+from twitchgamenotify.constants import (
+    HTTP_200_OK,
+    HTTP_304_NOT_MODIFIED,
+    HTTP_TIMEOUT,
+    ICON_BOX_ART_SIZE,
+    ICON_CACHE_DIR,
+    ICON_CACHE_MAX_BYTES,
+    SINK_CLOSE_TIMEOUT,
+)
+from twitchgamenotify.twitch_api import FailedHttpRequest
+
+# Kinds of icons, used to prefix their names in the cache
+ICON_STREAMER = "streamer"
+ICON_GAME = "game"
+
+
+class IconCache:
+    """A size-capped cache of images on disk.
+
+    An index file keeps track of each image's URL, ETag, size, and when
+    it was last used.
+    """
+
+    def __init__(
+        self, cache_dir=ICON_CACHE_DIR, max_bytes=ICON_CACHE_MAX_BYTES
+    ):
+        """Load the cache's index.
+
+        Args:
+            cache_dir: An optional string containing the directory to
+                keep images in.
+            max_bytes: An optional integer containing how many bytes of
+                images to keep at most.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._index_path = os.path.join(cache_dir, "index.json")
+        self._lock = threading.Lock()
+
+        # A function to call with the name of each image evicted, or
+        # None. It's called with the cache's lock held.
+        self.on_evict = None
+
+        try:
+            with open(self._index_path, "r", encoding="utf-8") as index:
+                self._entries = json.load(index)
+        except (OSError, ValueError):
+            self._entries = {}
+
+        # Forget about images which have gone missing
+        self._entries = {
+            name: entry
+            for name, entry in self._entries.items()
+            if os.path.exists(os.path.join(cache_dir, entry["file"]))
+        }
+
+    def get(self, name):
+        """Return the path of a cached image, marking it as used.
+
+        Arg:
+            name: A string containing the name of the image.
+
+        Returns:
+            A string containing the path of the image, or None if it
+            isn't cached.
+        """
+        with self._lock:
+            entry = self._entries.get(name)
+
+            if entry is None:
+                return None
+
+            entry["used"] = clock.time()
+
+            return os.path.join(self.cache_dir, entry["file"])
+
+    def get_validator(self, name, url):
+        """Return the ETag of a cached image, if it came from a URL.
+
+        Args:
+            name: A string containing the name of the image.
+            url: A string containing the URL the image is at now.
+
+        Returns:
+            A string containing the ETag, or None if there's no cached
+            image from the URL or it didn't come with an ETag.
+        """
+        with self._lock:
+            entry = self._entries.get(name)
+
+            if entry is None or entry["url"] != url:
+                return None
+
+            return entry["etag"]
+
+    def store(self, name, url, etag, content):
+        """Cache an image, evicting others if the cache is full.
+
+        Args:
+            name: A string containing the name of the image.
+            url: A string containing the URL the image came from.
+            etag: A string containing the image's ETag, or None.
+            content: A bytes object containing the image.
+
+        Returns:
+            A string containing the path of the image.
+        """
+        # Keep the image's extension so its type is easy to tell
+        extension = os.path.splitext(urllib.parse.urlparse(url).path)[1]
+        file_name = name + extension
+        path = os.path.join(self.cache_dir, file_name)
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        # Write to a temporary file first so the notification daemon
+        # never sees half an image
+        with open(path + ".tmp", "wb") as image_file:
+            image_file.write(content)
+
+        os.replace(path + ".tmp", path)
+
+        with self._lock:
+            old_entry = self._entries.get(name)
+
+            if old_entry is not None and old_entry["file"] != file_name:
+                self._remove_file(old_entry["file"])
+
+            self._entries[name] = dict(
+                file=file_name,
+                url=url,
+                etag=etag,
+                size=len(content),
+                used=clock.time(),
+            )
+            self._evict()
+
+        return path
+
+    def save(self):
+        """Write the cache's index to disk."""
+        with self._lock:
+            entries = json.dumps(self._entries)
+
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+            with open(self._index_path, "w", encoding="utf-8") as index:
+                index.write(entries)
+        except OSError as e:
+            logging.warning("Unable to save icon cache index: %s", e)
+
+    def _evict(self):
+        """Remove the least recently used images until under the cap."""
+        total = sum(entry["size"] for entry in self._entries.values())
+
+        if total <= self.max_bytes:
+            return
+
+        for name in sorted(
+            self._entries, key=lambda name: self._entries[name]["used"]
+        ):
+            entry = self._entries.pop(name)
+            self._remove_file(entry["file"])
+            total -= entry["size"]
+
+            if self.on_evict is not None:
+                self.on_evict(name)
+
+            if total <= self.max_bytes:
+                break
+
+    def _remove_file(self, file_name):
+        """Remove an image file, if it's there."""
+        try:
+            os.remove(os.path.join(self.cache_dir, file_name))
+        except OSError:
+            pass
+
+
+class IconFetcher:
+    """Fetches streamer avatars and game box art in the background."""
+
+    def __init__(self, twitch_api, cache):
+        """Start the fetching thread.
+
+        Args:
+            twitch_api: A TwitchApi to look up image URLs with.
+            cache: An IconCache to keep images in.
+        """
+        self.twitch_api = twitch_api
+        self.cache = cache
+
+        # Images are fetched from Twitch's CDN, which doesn't need (and
+        # shouldn't get) the API's credentials
+        self.session = requests.Session()
+
+        # Icon name -> path (or None if there's no image) for every icon
+        # fetched this run, until the cache evicts it
+        self._icons = {}
+        self._pending = set()
+        self._lock = threading.Lock()
+
+        cache.on_evict = self._forget
+
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def get_streamer_icon(self, streamer_login):
+        """Return the path of a streamer's avatar, without waiting.
+
+        Arg:
+            streamer_login: A string containing the streamer's login
+                name, in any case.
+
+        Returns:
+            A string containing the path of the image, or None if it
+            isn't available yet.
+        """
+        return self._get(ICON_STREAMER, streamer_login.lower())
+
+    def get_game_icon(self, game_id):
+        """Return the path of a game's box art, without waiting.
+
+        Arg:
+            game_id: A string containing the game's ID.
+
+        Returns:
+            A string containing the path of the image, or None if it
+            isn't available yet.
+        """
+        return self._get(ICON_GAME, game_id)
+
+    def prefetch(self, streamer_logins=(), game_ids=()):
+        """Start fetching icons before they're needed.
+
+        Args:
+            streamer_logins: An optional iterable of strings containing
+                the login names of streamers to fetch avatars for.
+            game_ids: An optional iterable of strings containing the
+                IDs of games to fetch box art for.
+        """
+        for streamer_login in streamer_logins:
+            self._get(ICON_STREAMER, streamer_login.lower())
+
+        for game_id in game_ids:
+            self._get(ICON_GAME, game_id)
+
+    def close(self):
+        """Stop fetching and save the cache's index."""
+        self._queue.put(None)
+        self._thread.join(SINK_CLOSE_TIMEOUT)
+        self.session.close()
+        self.cache.save()
+
+    def _get(self, kind, key):
+        """Return the path of an icon, fetching it if needed.
+
+        Args:
+            kind: A string containing the kind of icon.
+            key: A string containing the streamer login or game ID.
+        """
+        if not key:
+            return None
+
+        name = kind + "-" + key
+
+        with self._lock:
+            if name in self._icons:
+                path = self._icons[name]
+
+                if path is None or os.path.exists(path):
+                    return path
+
+                # The image was removed from under us; fetch it again
+                del self._icons[name]
+
+            if name not in self._pending:
+                self._pending.add(name)
+                self._queue.put((kind, key))
+
+        # Meanwhile, use whatever was cached on a previous run
+        return self.cache.get(name)
+
+    def _forget(self, name):
+        """Forget an icon the cache evicted, so it's fetched again."""
+        with self._lock:
+            self._icons.pop(name, None)
+
+    def _run(self):
+        """Fetch requested icons until told to stop."""
+        while True:
+            requested = [self._queue.get()]
+
+            # Fetch everything requested so far together
+            while True:
+                try:
+                    requested.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = None in requested
+            requested = [r for r in requested if r is not None]
+
+            for kind, lookup in (
+                (ICON_STREAMER, self.twitch_api.get_profile_image_urls),
+                (ICON_GAME, self._get_box_art_urls),
+            ):
+                keys = [key for k, key in requested if k == kind]
+
+                if keys:
+                    self._fetch(kind, keys, lookup)
+
+            if stop:
+                return
+
+            self.cache.save()
+
+    def _get_box_art_urls(self, game_ids):
+        """Look up the box art URLs of games at the icon size."""
+        return self.twitch_api.get_box_art_urls(game_ids, *ICON_BOX_ART_SIZE)
+
+    def _fetch(self, kind, keys, lookup):
+        """Fetch the icons of one kind.
+
+        Args:
+            kind: A string containing the kind of icon.
+            keys: A list of strings containing the streamer logins or
+                game IDs to fetch icons for.
+            lookup: A function taking keys and returning a dictionary
+                mapping them to image URLs.
+        """
+        try:
+            urls = lookup(keys)
+        except (FailedHttpRequest, requests.exceptions.RequestException) as e:
+            logging.warning("Unable to look up icons: %s", e)
+
+            # Try again next time they're asked for
+            with self._lock:
+                self._pending.difference_update(kind + "-" + k for k in keys)
+
+            return
+
+        for key in keys:
+            name = kind + "-" + key
+            path = None
+
+            try:
+                if key in urls:
+                    path = self._download(name, urls[key])
+            except (requests.exceptions.RequestException, OSError) as e:
+                logging.warning("Unable to fetch icon %s: %s", name, e)
+
+                with self._lock:
+                    self._pending.discard(name)
+
+                continue
+
+            with self._lock:
+                self._icons[name] = path
+                self._pending.discard(name)
+
+    def _download(self, name, url):
+        """Download an image unless the cached copy is still current.
+
+        Args:
+            name: A string containing the name of the image.
+            url: A string containing the URL of the image.
+
+        Returns:
+            A string containing the path of the image, or None if it
+            couldn't be downloaded.
+        """
+        etag = self.cache.get_validator(name, url)
+        response = self.session.get(
+            url,
+            headers={"If-None-Match": etag} if etag else {},
+            timeout=HTTP_TIMEOUT,
+        )
+
+        if response.status_code == HTTP_304_NOT_MODIFIED:
+            return self.cache.get(name)
+
+        if response.status_code != HTTP_200_OK:
+            logging.warning(
+                "Fetching icon %s failed with status code %s",
+                name,
+                response.status_code,
+            )
+            return None
+
+        return self.cache.store(
+            name, url, response.headers.get("ETag"), response.content
+        )
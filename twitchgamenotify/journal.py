@@ -0,0 +1,428 @@
+"""Contains an append-only journal of stream transitions.
+
+Each transition takes up a single tab-separated line of the form
+
+    time<TAB>kind<TAB>streamer login<TAB>game ID<TAB>game name
+
+where time is a Unix time in whole seconds. Lines are only ever
+appended, so each journal file is sorted by time, and once the current
+file gets too large it's rotated out to journal.tsv.1, journal.tsv.2,
+and so on, just like logging's RotatingFileHandler.
+"""
+
+import bisect
+import collections
+import datetime
+import logging
+import os
+import threading
+from twitchgamenotify import clock
+from twitchgamenotify.constants import (
+    JOURNAL_BACKUP_COUNT,
+    JOURNAL_FLUSH_INTERVAL,
+    JOURNAL_MAX_BYTES,
+    TRANSITION_GAME_CHANGE,
+    TRANSITION_LIVE,
+    TRANSITION_OFFLINE,
+)
+from twitchgamenotify.events import StreamTransition
+
+
+# Characters which would break up a journal line
+LINE_UNSAFE_CHARACTERS = str.maketrans({"\t": " ", "\n": " ", "\r": " "})
+
+# Units accepted by parse_duration
+DURATION_UNITS = {"m": 60, "h": 60 * 60, "d": 24 * 60 * 60, "w": 7 * 86400}
+
+
+def format_transition(transition):
+    """Format a transition as a journal line.
+
+    Arg:
+        transition: A StreamTransition to format.
+
+    Returns:
+        A string containing the journal line, including its trailing
+        newline.
+    """
+    return "%d\t%s\t%s\t%s\t%s\n" % (
+        transition.time,
+        transition.kind,
+        transition.streamer_login,
+        transition.game_id,
+        transition.game_name.translate(LINE_UNSAFE_CHARACTERS),
+    )
+
+
+def parse_transition(line):
+    """Parse a journal line into a transition.
+
+    Arg:
+        line: A string containing a journal line.
+
+    Returns:
+        A StreamTransition, or None if the line is malformed (which
+        can happen for the last line of a journal if we were killed
+        mid-write).
+    """
+    fields = line.rstrip("\n").split("\t")
+
+    if len(fields) != 5:
+        return None
+
+    try:
+        time = int(fields[0])
+    except ValueError:
+        return None
+
+    return StreamTransition(time, *fields[1:])
+
+
+def get_journal_paths(path, backup_count=JOURNAL_BACKUP_COUNT):
+    """Return the existing journal files, oldest first.
+
+    Args:
+        path: A string containing the path of the current journal file.
+        backup_count: An optional integer containing how many rotated
+            journal files may exist.
+
+    Returns:
+        A list of strings containing paths to journal files.
+    """
+    paths = ["%s.%d" % (path, i) for i in range(backup_count, 0, -1)]
+    paths.append(path)
+
+    return [p for p in paths if os.path.exists(p)]
+
+
+class TransitionJournal:
+    """Appends stream transitions to a journal file.
+
+    Recording a transition only appends it to an in-memory batch; a
+    background thread writes out the batch every flush interval with a
+    single write call. That way the threads querying the Twitch API
+    never wait on the disk.
+
+    Login names are recorded in lowercase, since Twitch treats them
+    case-insensitively. Streamers still live when the journal is closed
+    are recorded as going offline, so the time we weren't watching
+    isn't counted as time spent streaming.
+    """
+
+    def __init__(
+        self,
+        path,
+        max_bytes=JOURNAL_MAX_BYTES,
+        backup_count=JOURNAL_BACKUP_COUNT,
+        flush_interval=JOURNAL_FLUSH_INTERVAL,
+    ):
+        """Set up the journal.
+
+        Args:
+            path: A string containing the path of the journal file.
+            max_bytes: An optional integer containing the size a
+                journal file may grow to before being rotated.
+            backup_count: An optional integer containing how many
+                rotated journal files to keep.
+            flush_interval: An optional number containing how many
+                seconds to wait between writes.
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.flush_interval = flush_interval
+
+        # Transitions waiting to be written
+        self._pending = []
+        self._pending_lock = threading.Lock()
+
+        # Streamer login -> their last transition, for streamers who are
+        # live. Guarded by the pending lock.
+        self._live = {}
+
+        # Only one thread at a time should be writing to the file
+        self._write_lock = threading.Lock()
+
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def record(self, transition):
+        """Queue a transition to be written to the journal.
+
+        Arg:
+            transition: A StreamTransition to record.
+        """
+        transition = transition._replace(
+            streamer_login=transition.streamer_login.lower()
+        )
+
+        with self._pending_lock:
+            self._pending.append(transition)
+
+            if transition.kind == TRANSITION_OFFLINE:
+                self._live.pop(transition.streamer_login, None)
+            else:
+                self._live[transition.streamer_login] = transition
+
+    def start(self):
+        """Start writing queued transitions in the background."""
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Stop the background writer and write anything queued.
+
+        Streamers who are live are recorded as going offline first.
+        """
+        self._stop_event.set()
+
+        if self._thread is not None:
+            self._thread.join()
+
+        now = clock.time()
+
+        with self._pending_lock:
+            live_transitions = list(self._live.values())
+
+        for transition in live_transitions:
+            self.record(
+                transition._replace(
+                    time=now, kind=TRANSITION_OFFLINE, game_id="", game_name=""
+                )
+            )
+
+        self.flush()
+
+    def _run(self):
+        """Periodically flush the journal until we're closed."""
+        while not self._stop_event.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """Write all queued transitions to the journal file."""
+        # Take the batch so recording can continue while we write
+        with self._pending_lock:
+            batch, self._pending = self._pending, []
+
+        if not batch:
+            return
+
+        data = "".join(format_transition(t) for t in batch).encode("utf-8")
+
+        with self._write_lock:
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+                if self._should_rotate(len(data)):
+                    self._rotate()
+
+                with open(self.path, "ab") as journal_file:
+                    journal_file.write(data)
+            except OSError as e:
+                logging.error("Unable to write to journal: %s", e)
+
+    def _should_rotate(self, incoming_bytes):
+        """Return whether writing more bytes needs a rotation first."""
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return False
+
+        return size and size + incoming_bytes > self.max_bytes
+
+    def _rotate(self):
+        """Shift the journal files along by one, dropping the oldest."""
+        for i in range(self.backup_count - 1, 0, -1):
+            source = "%s.%d" % (self.path, i)
+
+            if os.path.exists(source):
+                os.replace(source, "%s.%d" % (self.path, i + 1))
+
+        if self.backup_count:
+            os.replace(self.path, self.path + ".1")
+        else:
+            os.remove(self.path)
+
+
+class JournalIndex:
+    """An in-memory index of journal transitions.
+
+    Supports looking up transitions by time range, optionally for a
+    single streamer, using binary searches. Streamers' login names are
+    matched ignoring case.
+    """
+
+    def __init__(self, transitions):
+        """Build the indices.
+
+        Arg:
+            transitions: An iterable of StreamTransitions.
+        """
+        self.transitions = sorted(transitions, key=lambda t: t.time)
+        self._times = [t.time for t in self.transitions]
+
+        # Streamer login -> (times, transitions)
+        self._by_streamer = collections.defaultdict(lambda: ([], []))
+
+        for transition in self.transitions:
+            times, streamer_transitions = self._by_streamer[
+                transition.streamer_login.lower()
+            ]
+            times.append(transition.time)
+            streamer_transitions.append(transition)
+
+    @classmethod
+    def from_journal(cls, path, backup_count=JOURNAL_BACKUP_COUNT):
+        """Build an index from a journal and its rotated files.
+
+        Args:
+            path: A string containing the path of the journal file.
+            backup_count: An optional integer containing how many
+                rotated journal files may exist.
+
+        Returns:
+            A JournalIndex.
+        """
+        transitions = []
+
+        for journal_path in get_journal_paths(path, backup_count):
+            with open(journal_path, "r", encoding="utf-8") as journal_file:
+                for line in journal_file:
+                    transition = parse_transition(line)
+
+                    if transition is not None:
+                        transitions.append(transition)
+
+        return cls(transitions)
+
+    def query(self, streamer_login=None, since=None, until=None):
+        """Find transitions within a time range.
+
+        Args:
+            streamer_login: An optional string containing the login name
+                of the streamer to find transitions for. Defaults to
+                None, which finds transitions for all streamers.
+            since: An optional number containing the Unix time to start
+                from (inclusive). Defaults to the start of the journal.
+            until: An optional number containing the Unix time to end at
+                (exclusive). Defaults to the end of the journal.
+
+        Returns:
+            A list of StreamTransitions sorted by time.
+        """
+        if streamer_login is None:
+            times, transitions = self._times, self.transitions
+        elif streamer_login.lower() in self._by_streamer:
+            times, transitions = self._by_streamer[streamer_login.lower()]
+        else:
+            return []
+
+        start = 0 if since is None else bisect.bisect_left(times, since)
+        end = len(times) if until is None else bisect.bisect_left(times, until)
+
+        return transitions[start:end]
+
+    def last_before(self, streamer_login, time):
+        """Find a streamer's last transition before a given time.
+
+        Args:
+            streamer_login: A string containing the login name of the
+                streamer.
+            time: A number containing a Unix time.
+
+        Returns:
+            A StreamTransition, or None if there isn't one.
+        """
+        if streamer_login.lower() not in self._by_streamer:
+            return None
+
+        times, transitions = self._by_streamer[streamer_login.lower()]
+        position = bisect.bisect_left(times, time)
+
+        return transitions[position - 1] if position else None
+
+
+def parse_duration(duration):
+    """Parse a duration like "7d" or "12h" into seconds.
+
+    Arg:
+        duration: A string containing a number followed by one of m
+            (minutes), h (hours), d (days), or w (weeks).
+
+    Returns:
+        An integer containing the number of seconds.
+
+    Raises:
+        ValueError: The duration couldn't be parsed.
+    """
+    try:
+        return int(float(duration[:-1]) * DURATION_UNITS[duration[-1]])
+    except (IndexError, KeyError):
+        raise ValueError("invalid duration: %r" % duration) from None
+
+
+def format_seconds(seconds):
+    """Format a number of seconds as hours and minutes."""
+    hours, minutes = divmod(int(seconds) // 60, 60)
+
+    return "%dh%02dm" % (hours, minutes)
+
+
+def print_streamer_history(journal_path, streamer_login, since, until):
+    """Print what a streamer played within a time range.
+
+    Prints each transition in the range followed by how long the
+    streamer spent on each game within it.
+
+    Args:
+        journal_path: A string containing the path of the journal file.
+        streamer_login: A string containing the login name of the
+            streamer.
+        since: A number containing the Unix time to start from.
+        until: A number containing the Unix time to end at.
+    """
+    index = JournalIndex.from_journal(journal_path)
+    transitions = index.query(streamer_login, since, until)
+
+    # Account for a session that was already running at the start
+    previous = index.last_before(streamer_login, since)
+
+    if previous is not None and previous.kind != TRANSITION_OFFLINE:
+        transitions.insert(0, previous._replace(time=since))
+
+    if not transitions:
+        print("No activity recorded for %s" % streamer_login)
+        return
+
+    # Print the transitions, tallying up time spent on each game
+    time_per_game = collections.OrderedDict()
+
+    for transition, next_transition in zip(
+        transitions, transitions[1:] + [None]
+    ):
+        timestamp = datetime.datetime.fromtimestamp(transition.time)
+        print(
+            "%s  %-7s %s"
+            % (
+                timestamp.strftime("%Y-%m-%d %H:%M"),
+                transition.kind,
+                transition.game_name,
+            )
+        )
+
+        if transition.kind in (TRANSITION_LIVE, TRANSITION_GAME_CHANGE):
+            end = (
+                next_transition.time if next_transition is not None else until
+            )
+            time_per_game[transition.game_name] = (
+                time_per_game.get(transition.game_name, 0)
+                + end
+                - transition.time
+            )
+
+    print()
+
+    for game_name, seconds in sorted(
+        time_per_game.items(), key=lambda item: -item[1]
+    ):
+        print("%8s  %s" % (format_seconds(seconds), game_name))
@@ -0,0 +1,208 @@
+"""Contains detection latency measurement and query period tuning.
+
+The detection latency of a stream going live is how long after the
+stream started (according to Twitch) we noticed it. It's made up of how
+long Twitch takes to list a new stream plus however long we take to
+query it, which depends on the query period. Streams which were already
+live when we started watching don't count.
+"""
+
+import collections
+import logging
+import math
+import threading
+from twitchgamenotify import clock
+from twitchgamenotify.constants import (
+    DEFAULT_TARGET_P95_LATENCY,
+    LATENCY_WINDOW,
+    TUNER_MAX_PERIOD_FACTOR,
+    TUNER_MIN_SAMPLES,
+    TUNER_RATE_LIMIT_FRACTION,
+    TUNER_SLOW_DOWN,
+    TUNER_SPEED_UP,
+)
+
+
+def percentile(sorted_values, percent):
+    """Return a percentile of some values using the nearest-rank method.
+
+    Args:
+        sorted_values: A non-empty sorted list of numbers.
+        percent: A number between 0 and 100 containing the percentile.
+    """
+    rank = max(math.ceil(percent / 100 * len(sorted_values)), 1)
+
+    return sorted_values[rank - 1]
+
+
+class LatencyTracker:
+    """Keeps track of recent detection latencies."""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        """Set up the tracker.
+
+        Arg:
+            window: An optional integer containing how many of the most
+                recent latencies to keep.
+        """
+        self._latencies = collections.deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.total = 0
+
+        # Streams started before this were already live when we started
+        self.started = clock.time()
+
+    def record(self, started_at, detected_at):
+        """Record the detection latency of a stream going live.
+
+        Args:
+            started_at: A number containing the Unix time the stream
+                started at.
+            detected_at: A number containing the Unix time we noticed
+                the stream was live.
+        """
+        if started_at < self.started:
+            return
+
+        with self._lock:
+            self._latencies.append(detected_at - started_at)
+            self.total += 1
+
+    def __len__(self):
+        """Return how many latencies are being kept."""
+        return len(self._latencies)
+
+    def percentiles(self, percents=(50, 90, 95, 99)):
+        """Return percentiles of the latencies being kept.
+
+        Arg:
+            percents: An optional tuple of numbers containing the
+                percentiles to compute.
+
+        Returns:
+            A dictionary where the keys are the given percents and the
+            values are the latencies in seconds, or an empty dictionary
+            if there are no latencies yet.
+        """
+        with self._lock:
+            latencies = sorted(self._latencies)
+
+        if not latencies:
+            return {}
+
+        return {p: percentile(latencies, p) for p in percents}
+
+    def summary(self):
+        """Return a string summarizing the latencies."""
+        percentiles = self.percentiles()
+
+        if not percentiles:
+            return "no detection latencies recorded"
+
+        return "detection latency over the last %d of %d go-lives: %s" % (
+            len(self),
+            self.total,
+            ", ".join("p%d %.1fs" % item for item in percentiles.items()),
+        )
+
+
+class QueryPeriodTuner:
+    """Adjusts the query period to meet a target p95 detection latency.
+
+    The period is shortened while the p95 latency is above the target
+    and lengthened while it's comfortably below it, but never so short
+    that the requests made each cycle would use more than a fraction of
+    the API's rate limit, nor longer than a multiple of the configured
+    period.
+    """
+
+    def __init__(
+        self,
+        query_period,
+        latency_tracker,
+        twitch_api,
+        target_p95=DEFAULT_TARGET_P95_LATENCY,
+    ):
+        """Set up the tuner.
+
+        Args:
+            query_period: A number containing the configured query
+                period, in seconds, which is used to start with.
+            latency_tracker: A LatencyTracker to get latencies from.
+            twitch_api: A TwitchApi object whose requests are counted
+                towards the rate limit.
+            target_p95: An optional number containing the p95 detection
+                latency to aim for, in seconds.
+        """
+        self.period = query_period
+        self.max_period = query_period * TUNER_MAX_PERIOD_FACTOR
+        self.latency_tracker = latency_tracker
+        self.twitch_api = twitch_api
+        self.target_p95 = target_p95
+
+        self._last_request_count = twitch_api.request_count
+        self._last_tracker_total = latency_tracker.total
+
+    def min_period(self, requests_per_cycle):
+        """Return the shortest period the rate limit allows.
+
+        Arg:
+            requests_per_cycle: An integer containing how many requests
+                were made over the last query period.
+        """
+        limit = self.twitch_api.ratelimit_limit
+
+        if not limit or not requests_per_cycle:
+            return 0
+
+        # The rate limit is given in points per minute, with each
+        # request costing a point
+        return requests_per_cycle * 60 / (limit * TUNER_RATE_LIMIT_FRACTION)
+
+    def update(self):
+        """Adjust the period based on the last cycle.
+
+        Returns:
+            A number containing the period to wait before the next
+            cycle, in seconds.
+        """
+        request_count = self.twitch_api.request_count
+        requests_per_cycle = request_count - self._last_request_count
+        self._last_request_count = request_count
+
+        min_period = self.min_period(requests_per_cycle)
+        period = self.period
+
+        # Only react to new latencies, and only once we have enough
+        if (
+            len(self.latency_tracker) >= TUNER_MIN_SAMPLES
+            and self.latency_tracker.total != self._last_tracker_total
+        ):
+            self._last_tracker_total = self.latency_tracker.total
+            p95 = self.latency_tracker.percentiles((95,))[95]
+
+            if p95 > self.target_p95:
+                period *= TUNER_SPEED_UP
+            elif p95 < self.target_p95 / 2:
+                period *= TUNER_SLOW_DOWN
+
+        period = min(max(period, min_period), self.max_period)
+
+        if period != self.period:
+            logging.info(
+                "Query period now %.1fs (%s)",
+                period,
+                self.latency_tracker.summary(),
+            )
+            self.period = period
+
+        # Wait for the rate limit to refill if another cycle would use
+        # it up, whatever the latencies say
+        remaining = self.twitch_api.ratelimit_remaining
+
+        if remaining is not None and remaining < requests_per_cycle:
+            return max(
+                self.period, self.twitch_api.ratelimit_reset - clock.time()
+            )
+
+        return self.period
@@ -0,0 +1,51 @@
+"""Contains the labels shown for live streamers in the app indicator.
+
+These are kept apart from the app indicator itself so working out what
+changed doesn't need GTK.
+"""
+
+import threading
+
+
+class LiveLabels:
+    """Keeps track of the label shown for each live streamer."""
+
+    def __init__(self):
+        """Start with nobody live."""
+        # Streamer login -> the label they were last given
+        self._labels = {}
+        self._lock = threading.Lock()
+
+    def update(self, live_streamers):
+        """Update the labels and return which of them changed.
+
+        This can be called from any thread.
+
+        Arg:
+            live_streamers: A dictionary where the keys are strings
+                containing streamers' login names and the values are
+                tuples containing the streamer's display name and the
+                name of the game they're streaming if they're live, or
+                None if they're offline. Streamers which aren't included
+                are left as they are.
+
+        Returns:
+            A list of tuples containing the login name of each streamer
+            whose label changed and their new label, or None if they
+            went offline.
+        """
+        changes = []
+
+        with self._lock:
+            for streamer_login_name, live_info in live_streamers.items():
+                label = None if live_info is None else "%s — %s" % live_info
+
+                if self._labels.get(streamer_login_name) != label:
+                    changes.append((streamer_login_name, label))
+
+                    if label is None:
+                        del self._labels[streamer_login_name]
+                    else:
+                        self._labels[streamer_login_name] = label
+
+        return changes
@@ -1,6 +1,7 @@
 """Contains the main function."""
 
 import atexit
+import collections
 import logging
 import time
 import threading
@@ -8,18 +9,54 @@ import signal
 import sys
 import notify2
 import requests
+from twitchgamenotify import clock
+from twitchgamenotify.clock import VirtualClock
 from twitchgamenotify.configuration import (
     ConfigFileInvalid,
     ConfigFileNotFound,
     parse_config_file,
     parse_runtime_args,
 )
+from twitchgamenotify.constants import (
+    CYCLE_DEADLINE,
+    DEFAULT_TARGET_P95_LATENCY,
+    ICON_PREFETCH_LIMIT,
+    JOURNAL_FILE_PATH,
+)
+from twitchgamenotify.icons import IconCache, IconFetcher
+from twitchgamenotify.journal import (
+    TransitionJournal,
+    parse_duration,
+    print_streamer_history,
+)
+from twitchgamenotify.latency import LatencyTracker, QueryPeriodTuner
+from twitchgamenotify.matching import compile_streamer_filters
 from twitchgamenotify.notifications import (
+    get_watched_games,
+    handle_failed_http_request,
     process_notifications_wrapper,
     send_authentication_error_notification,
     send_connection_error_notification,
 )
-from twitchgamenotify.twitch_api import AuthenticationFailed, TwitchApi
+from twitchgamenotify.replay import (
+    RecordingSession,
+    ReplaySession,
+    run_replay,
+)
+from twitchgamenotify.scheduling import CycleRunner
+from twitchgamenotify.sinks import (
+    DbusSink,
+    JsonLinesSink,
+    SinkDispatcher,
+    TerminalSink,
+    WebhookSink,
+)
+from twitchgamenotify.trace import TRACE
+from twitchgamenotify.twitch_api import (
+    AuthenticationFailed,
+    FailedHttpRequest,
+    TwitchApi,
+)
 from twitchgamenotify.version import NAME
 
 
@@ -44,22 +81,80 @@ def main():
     signal.signal(signal.SIGTERM, graceful_exit)
     signal.signal(signal.SIGINT, graceful_exit)
 
+    # Trace what we're doing, and dump the trace buffer on request
+    TRACE.enabled = True
+    signal.signal(
+        signal.SIGUSR1, lambda *_: TRACE.dump_in_background("signal")
+    )
+
+    # Answer history queries straight from the journal
+    if cli_args.history:
+        try:
+            since_seconds = parse_duration(cli_args.since)
+        except ValueError as e:
+            logging.error(e)
+            sys.exit(1)
+
+        now = time.time()
+        print_streamer_history(
+            JOURNAL_FILE_PATH,
+            cli_args.history,
+            since=now - since_seconds,
+            until=now,
+        )
+        sys.exit(0)
+
     # Read config file
     try:
         config_dict = parse_config_file()
     except ConfigFileNotFound:
         logging.error("Config file not found. Aborting.")
         sys.exit(1)
-    except ConfigFileInvalid:
+    except ConfigFileInvalid as e:
+        for error in e.errors:
+            logging.error(error)
+
         logging.error("Config file invalid. Aborting.")
         sys.exit(1)
 
+    # Set up recording or replaying Twitch API responses
+    session = None
+    query_period = config_dict["query-period"]
+
+    if cli_args.replay:
+        try:
+            session = ReplaySession(cli_args.replay)
+        except (OSError, ValueError) as e:
+            logging.error("Unable to load cassette: %s", e)
+            sys.exit(1)
+
+        query_period = session.query_period
+        clock.set_clock(
+            VirtualClock(session.start, speed=cli_args.replay_speed)
+        )
+
+        # Replayed notifications are about the past, so print them
+        # rather than showing them on the desktop
+        cli_args.print_to_terminal = True
+    elif cli_args.record:
+        try:
+            session = RecordingSession(cli_args.record, query_period)
+        except OSError as e:
+            logging.error("Unable to open cassette: %s", e)
+            sys.exit(1)
+
+        atexit.register(session.close)
+
     # Set up the notifier
     if not cli_args.print_to_terminal:
         notify2.init(NAME)
 
+    # Lets the app indicator ask for a query cycle right away
+    poll_now_event = threading.Event()
+    indicator = None
+
     # Set up app indicator and run it in a separate thread
-    if (
+    if not cli_args.replay and (
         not cli_args.one_shot
         or not cli_args.print_to_terminal
         or cli_args.no_app_indicator
@@ -70,7 +165,7 @@ def main():
         from twitchgamenotify.app_indicator import AppIndicator # pylint: disable=import-outside-toplevel
         # fmt: on
 
-        indicator = AppIndicator()
+        indicator = AppIndicator(poll_now_callback=poll_now_event.set)
 
         # Kill the indicator when we quit
         atexit.register(indicator.stop)
@@ -87,6 +182,7 @@ def main():
             twitch_api = TwitchApi(
                 client_id=config_dict["twitch-api-client-id"],
                 client_secret=config_dict["twitch-api-client-secret"],
+                session=session,
             )
 
             # Successful connection; reset retry attempts
@@ -100,7 +196,10 @@ def main():
                 send_dbus_notification=not cli_args.print_to_terminal,
             )
             sys.exit(1)
-        except requests.exceptions.ConnectionError:
+        except (
+            requests.exceptions.ConnectionError,
+            requests.exceptions.Timeout,
+        ):
             # Internet is probably down. Log an error and notify if we're
             # notifying
             retry_attempt += 1
@@ -114,10 +213,86 @@ def main():
             # Wait a bit before retrying
             time.sleep(sleep_delta)
 
+    # Look up the IDs of the games to discover streams for - keep
+    # retrying like when connecting, since a hiccup shouldn't stop us
+    # starting
+    retry_attempt = 0
+
+    while True:
+        try:
+            games = get_watched_games(twitch_api, config_dict["games"])
+
+            break
+        except FailedHttpRequest as e:
+            retry_attempt += 1
+            sleep_delta = min(2 ** retry_attempt, 20)
+
+            handle_failed_http_request(
+                e,
+                config_dict[
+                    "ignore-502-errors-one-shot"
+                    if cli_args.one_shot
+                    else "ignore-502-errors-persistant"
+                ],
+                cli_args.print_to_terminal,
+            )
+        except requests.exceptions.RequestException:
+            retry_attempt += 1
+            sleep_delta = min(2 ** retry_attempt, 20)
+
+            send_connection_error_notification(
+                send_dbus_notification=not cli_args.print_to_terminal,
+                retry_seconds=sleep_delta,
+            )
+
+        # Wait a bit before retrying
+        time.sleep(sleep_delta)
+
+    # Set up where notifications get sent
+    sinks = []
+
+    if not cli_args.print_to_terminal:
+        # Show streamer avatars (or game box art) as notification icons
+        icons = IconFetcher(twitch_api, IconCache())
+        atexit.register(icons.close)
+
+        # Fetch icons ahead of time, unless there are too many to bother
+        # with
+        if (
+            not cli_args.one_shot
+            and len(config_dict["streamers"]) <= ICON_PREFETCH_LIMIT
+        ):
+            icons.prefetch(
+                streamer_logins=config_dict["streamers"],
+                game_ids=games,
+            )
+
+        sinks.append(DbusSink(icons=icons))
+    elif cli_args.json_lines != "-":
+        sinks.append(TerminalSink())
+
+    if cli_args.json_lines:
+        try:
+            sinks.append(JsonLinesSink(cli_args.json_lines))
+        except OSError as e:
+            logging.error("Unable to open JSON lines output: %s", e)
+            sys.exit(1)
+
+    sinks.extend(WebhookSink(url) for url in cli_args.webhook)
+
+    sink_dispatcher = SinkDispatcher(sinks)
+    atexit.register(sink_dispatcher.close)
+
     # Set up arguments to give process_notifications
     kwargs = dict(
         print_to_terminal=cli_args.print_to_terminal,
-        streamers=config_dict["streamers"],
+        sinks=sink_dispatcher,
+        games=games,
+        streamers=compile_streamer_filters(
+            config_dict["streamers"],
+            include_title=config_dict.get("include-title", []),
+            exclude_title=config_dict.get("exclude-title", []),
+        ),
         twitch_api=twitch_api,
     )
 
@@ -135,18 +310,76 @@ def main():
 
         kwargs["streamers_previous_game"] = streamers_last_seen_playing_dict
 
+        # Remember whether a streamer's title passed their title filter
+        # so we can notify when it starts passing
+        kwargs["streamers_previous_title_match"] = {
+            streamer: False for streamer in config_dict["streamers"].keys()
+        }
+
+        # Pick up each cycle where the last one stopped, so a cycle cut
+        # short by its deadline doesn't skip the same streamers again
+        kwargs["streamers_order"] = collections.deque(config_dict["streamers"])
+
+        # Remember what game each discovered streamer was streaming so
+        # we only notify about new streams
+        kwargs["games_state"] = {}
+
+        # Keep the app indicator's list of live streamers up to date
+        if indicator is not None:
+            kwargs["live_streamers_callback"] = indicator.update_live_streamers
+
+        # Measure how long it takes us to notice streamers going live
+        latency_tracker = LatencyTracker()
+        kwargs["latency_tracker"] = latency_tracker
+        atexit.register(
+            lambda: logging.info(latency_tracker.summary().capitalize())
+        )
+
+        # Record transitions to the journal
+        if config_dict.get("journal", True) and not cli_args.replay:
+            journal = TransitionJournal(JOURNAL_FILE_PATH)
+            journal.start()
+            atexit.register(journal.close)
+
+            kwargs["journal"] = journal
+
     # Query (and possibly notify) only once or periodically
     if cli_args.one_shot:
         process_notifications_wrapper(**kwargs)
+    elif cli_args.replay:
+        cycles = run_replay(
+            process_notifications_wrapper,
+            session.start,
+            query_period,
+            **kwargs,
+        )
+        logging.info("Replayed %d query cycles", cycles)
     else:
+        cycle_runner = CycleRunner(
+            deadline=config_dict.get("cycle-deadline", CYCLE_DEADLINE)
+        )
+        atexit.register(cycle_runner.shutdown)
+
+        # Tune the query period to meet a detection latency target
+        if config_dict.get("auto-tune-query-period", False):
+            tuner = QueryPeriodTuner(
+                query_period,
+                kwargs["latency_tracker"],
+                twitch_api,
+                target_p95=config_dict.get(
+                    "target-p95-latency", DEFAULT_TARGET_P95_LATENCY
+                ),
+            )
+        else:
+            tuner = None
+
         # Loop until we get interrupted
         while True:
             # Process any notifications
-            threading.Thread(
-                target=process_notifications_wrapper,
-                kwargs=kwargs,
-                daemon=True,
-            ).start()
-
-            # Wait before querying again
-            time.sleep(config_dict["query-period"])
+            cycle_runner.run_cycle(process_notifications_wrapper, **kwargs)
+
+            # Wait before querying again (unless asked to poll now)
+            poll_now_event.wait(
+                tuner.update() if tuner is not None else query_period
+            )
+            poll_now_event.clear()
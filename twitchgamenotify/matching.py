@@ -0,0 +1,407 @@
+"""Contains matchers for the games and titles listed in the config file.
+
+Entries in a streamer's include and exclude lists can be
+
+- "*", which matches every game
+- a game's name or ID, which matches that game exactly
+- a glob like "Dark Souls*", which is matched against game names and IDs
+- a regex like "/^Resident Evil/i", which is searched for in game names
+  and IDs; the only flag supported is "i" (ignore case)
+
+All of a list's globs and regexes are compiled into a single regex when
+the config is loaded (except for regexes with groups, whose names and
+numbers would clash once combined, which are kept separate), and each
+filter remembers its decisions for the game IDs it has seen most
+recently, so deciding whether to notify about a game usually costs a
+dictionary lookup.
+
+Title keywords (include-title and exclude-title) are matched ignoring
+case anywhere within a stream's title. All of a streamer's keywords are
+compiled into a single Aho-Corasick automaton, so checking a title
+against every keyword takes one pass over the title.
+"""
+
+import collections
+import fnmatch
+import re
+from twitchgamenotify.constants import (
+    GAME_MATCH_CACHE_SIZE,
+    GAME_PATTERN_REGEX_FLAGS,
+    GAME_PATTERN_WILDCARD,
+)
+
+
+# Characters which make an entry a glob
+GLOB_CHARACTERS = frozenset("*?[")
+
+# Bit flags marking which list a title keyword came from
+TITLE_KEYWORD_INCLUDE = 1
+TITLE_KEYWORD_EXCLUDE = 2
+
+
+def parse_regex_pattern(pattern):
+    """Parse a "/regex/flags" game pattern.
+
+    Arg:
+        pattern: A string containing a game pattern.
+
+    Returns:
+        A tuple containing the regex string and a string of flags if the
+        pattern is a regex, or None otherwise.
+    """
+    if not pattern.startswith("/"):
+        return None
+
+    end = pattern.rfind("/")
+
+    if end == 0:
+        return None
+
+    flags = pattern[end + 1 :]
+
+    if not set(flags) <= set(GAME_PATTERN_REGEX_FLAGS):
+        return None
+
+    return pattern[1:end], flags
+
+
+def is_glob_pattern(pattern):
+    """Return whether a (non-regex) game pattern is a glob."""
+    if pattern == GAME_PATTERN_WILDCARD:
+        return False
+
+    return not GLOB_CHARACTERS.isdisjoint(pattern)
+
+
+def pattern_to_regex(pattern):
+    """Translate a glob or regex game pattern into a regex string.
+
+    Arg:
+        pattern: A string containing a glob or regex game pattern.
+
+    Returns:
+        A string containing a regex which can be searched for in a game
+        name or ID.
+    """
+    regex_pattern = parse_regex_pattern(pattern)
+
+    if regex_pattern is None:
+        # Globs have to match the whole name
+        return "^" + fnmatch.translate(pattern)
+
+    regex, flags = regex_pattern
+
+    if flags:
+        return "(?%s:%s)" % (flags, regex)
+
+    return "(?:%s)" % regex
+
+
+def is_valid_game_pattern(pattern):
+    """Return whether a game pattern's regex (if any) compiles."""
+    if parse_regex_pattern(pattern) is None:
+        return True
+
+    try:
+        re.compile(pattern_to_regex(pattern))
+    except re.error:
+        return False
+
+    return True
+
+
+class GameMatcher:
+    """Matches games against a list of game patterns."""
+
+    def __init__(self, patterns):
+        """Compile the patterns.
+
+        Arg:
+            patterns: A list of strings containing game patterns.
+        """
+        self.matches_everything = GAME_PATTERN_WILDCARD in patterns
+
+        # Names and IDs to match exactly. Globs are included so games
+        # with names like "[PROTOTYPE]" still match themselves.
+        self.literals = frozenset(
+            p for p in patterns if parse_regex_pattern(p) is None
+        )
+
+        # Everything else gets combined into a single regex, except
+        # for regexes with groups: combining those would clash group
+        # names and shift the numbers their backreferences refer to
+        combinable = []
+        self.regexes = []
+
+        for pattern in patterns:
+            is_regex = parse_regex_pattern(pattern) is not None
+
+            if not is_regex and not is_glob_pattern(pattern):
+                continue
+
+            regex = re.compile(pattern_to_regex(pattern))
+
+            if regex.groups:
+                self.regexes.append(regex)
+            else:
+                combinable.append(regex.pattern)
+
+        if combinable:
+            self.regexes.insert(0, re.compile("|".join(combinable)))
+
+    def matches(self, game_id, game_name):
+        """Return whether a game matches any of the patterns.
+
+        Args:
+            game_id: A string containing the game's ID.
+            game_name: A string containing the game's name.
+        """
+        if (
+            self.matches_everything
+            or game_id in self.literals
+            or game_name in self.literals
+        ):
+            return True
+
+        return any(
+            regex.search(game_name) or regex.search(game_id)
+            for regex in self.regexes
+        )
+
+
+class GameFilter:
+    """Decides which games to notify about for a streamer."""
+
+    def __init__(self, include, exclude=()):
+        """Compile the include and exclude lists.
+
+        Args:
+            include: A list of strings containing game patterns to
+                notify about.
+            exclude: An optional list of strings containing game
+                patterns not to notify about, even if they're included.
+        """
+        self.include = GameMatcher(include)
+        self.exclude = GameMatcher(exclude)
+
+        # Game ID -> whether to notify, least recently used first
+        self._cache = collections.OrderedDict()
+
+    def allows(self, game_id, game_name):
+        """Return whether to notify about a game.
+
+        Args:
+            game_id: A string containing the game's ID.
+            game_name: A string containing the game's name.
+        """
+        try:
+            self._cache.move_to_end(game_id)
+
+            return self._cache[game_id]
+        except KeyError:
+            pass
+
+        allowed = self.include.matches(
+            game_id, game_name
+        ) and not self.exclude.matches(game_id, game_name)
+
+        # Keep the cache from growing forever by forgetting the least
+        # recently used game
+        if len(self._cache) >= GAME_MATCH_CACHE_SIZE:
+            self._cache.popitem(last=False)
+
+        self._cache[game_id] = allowed
+
+        return allowed
+
+
+class KeywordAutomaton:
+    """An Aho-Corasick automaton for finding keywords within text.
+
+    Each keyword carries bit flags, and searching text returns the
+    union of the flags of every keyword occuring in it.
+    """
+
+    def __init__(self, keywords):
+        """Build the automaton.
+
+        Arg:
+            keywords: An iterable of tuples each containing a non-empty
+                keyword string and an integer of bit flags for it.
+        """
+        # State 0 is the root; each state has its transitions, the
+        # state to fall back to when there's no transition, and the
+        # flags of every keyword ending at the state
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [0]
+
+        # Build the trie of keywords
+        for keyword, flags in keywords:
+            state = 0
+
+            for character in keyword:
+                next_state = self._goto[state].get(character)
+
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][character] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append(0)
+
+                state = next_state
+
+            self._output[state] |= flags
+
+        # Link up the fallback states breadth first, so each state's
+        # fallback is already linked by the time we get to it
+        queue = collections.deque(self._goto[0].values())
+
+        while queue:
+            state = queue.popleft()
+
+            for character, next_state in self._goto[state].items():
+                queue.append(next_state)
+
+                fallback = self._fail[state]
+
+                while fallback and character not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+
+                self._fail[next_state] = self._goto[fallback].get(character, 0)
+
+                self._output[next_state] |= self._output[
+                    self._fail[next_state]
+                ]
+
+    def search(self, text, stop_flags=0):
+        """Find which keyword flags occur within some text.
+
+        Args:
+            text: A string to search.
+            stop_flags: An optional integer of bit flags. Searching
+                stops early once all of these have been found.
+
+        Returns:
+            An integer containing the union of the flags of all keywords
+            found.
+        """
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+
+        state = 0
+        found = 0
+
+        for character in text:
+            while state and character not in goto[state]:
+                state = fail[state]
+
+            state = goto[state].get(character, 0)
+            found |= output[state]
+
+            if stop_flags and found & stop_flags == stop_flags:
+                break
+
+        return found
+
+
+class TitleFilter:
+    """Decides which stream titles to notify about for a streamer."""
+
+    def __init__(self, include=(), exclude=()):
+        """Compile the title keywords.
+
+        Args:
+            include: An optional list of strings containing keywords,
+                one of which a title must contain to notify about it.
+                If empty, every title is included.
+            exclude: An optional list of strings containing keywords
+                which, if in a title, mean not to notify about it.
+        """
+        self.has_include = bool(include)
+        self.has_keywords = bool(include or exclude)
+
+        self.automaton = KeywordAutomaton(
+            [(k.casefold(), TITLE_KEYWORD_INCLUDE) for k in include]
+            + [(k.casefold(), TITLE_KEYWORD_EXCLUDE) for k in exclude]
+        )
+
+    def allows(self, title):
+        """Return whether to notify about a stream title.
+
+        Arg:
+            title: A string containing the stream's title.
+        """
+        if not self.has_keywords:
+            return True
+
+        found = self.automaton.search(
+            title.casefold(), stop_flags=TITLE_KEYWORD_EXCLUDE
+        )
+
+        if found & TITLE_KEYWORD_EXCLUDE:
+            return False
+
+        return not self.has_include or bool(found & TITLE_KEYWORD_INCLUDE)
+
+
+class StreamerFilter:
+    """Decides which streams to notify about for a streamer."""
+
+    def __init__(self, games, titles):
+        """Store the filters.
+
+        Args:
+            games: A GameFilter for the streamer.
+            titles: A TitleFilter for the streamer.
+        """
+        self.games = games
+        self.titles = titles
+
+
+def compile_streamer_filters(streamers, include_title=(), exclude_title=()):
+    """Compile the filters for each streamer in the config file.
+
+    Streamers with identical lists share filters (and hence caches).
+
+    Args:
+        streamers: A dictionary of streamers from the config file, where
+            the keys are strings containing the streamer's login name
+            and the values are dictionaries containing the user's
+            settings for the streamer.
+        include_title: An optional list of strings containing title
+            keywords to include for every streamer.
+        exclude_title: An optional list of strings containing title
+            keywords to exclude for every streamer.
+
+    Returns:
+        A dictionary where the keys are strings containing the
+        streamer's login name and the values are StreamerFilters.
+    """
+    game_filters = {}
+    title_filters = {}
+    streamer_filters = {}
+
+    for streamer_login_name, settings in streamers.items():
+        game_key = (
+            tuple(settings["include"]),
+            tuple(settings.get("exclude", ())),
+        )
+        title_key = (
+            tuple(include_title) + tuple(settings.get("include-title", ())),
+            tuple(exclude_title) + tuple(settings.get("exclude-title", ())),
+        )
+
+        if game_key not in game_filters:
+            game_filters[game_key] = GameFilter(*game_key)
+
+        if title_key not in title_filters:
+            title_filters[title_key] = TitleFilter(*title_key)
+
+        streamer_filters[streamer_login_name] = StreamerFilter(
+            game_filters[game_key], title_filters[title_key]
+        )
+
+    return streamer_filters
@@ -1,48 +1,22 @@
 """Functions for processing and displaying notifications."""
 
-import datetime
+import collections
 import logging
 import time
-import notify2
 import requests
-from twitchgamenotify.constants import HTTP_502_BAD_GATEWAY
+from twitchgamenotify import clock
+from twitchgamenotify.constants import (
+    HTTP_502_BAD_GATEWAY,
+    TRANSITION_GAME_CHANGE,
+    TRANSITION_LIVE,
+    TRANSITION_OFFLINE,
+)
+from twitchgamenotify.events import Notification, StreamTransition
+from twitchgamenotify.trace import TRACE, trace
 from twitchgamenotify.twitch_api import FailedHttpRequest
 from twitchgamenotify.version import NAME
 
 
-# ANSI escape sequence for bold text
-ANSI_BOLD = "\033[1m"
-ANSI_END = "\033[0m"
-
-
-def print_notification_to_terminal(streamer_name, stream_title, game_name):
-    """Print a game notification to the terminal.
-
-    Args:
-        streamer_name: A string containing the name of the streamer.
-        stream_title: A string containing the title of the stream.
-        game_name: A string containing the name of the game.
-    """
-    print(ANSI_BOLD + streamer_name + ANSI_END, end="")
-    print(" @ " + datetime.datetime.now().isoformat())
-    print("Streaming %s" % game_name)
-    print("Title: %s" % stream_title)
-
-
-def send_notification_to_dbus(streamer_name, stream_title, game_name):
-    """Send a game notification to D-Bus.
-
-    Args:
-        streamer_name: A string containing the name of the streamer.
-        stream_title: A string containing the title of the stream.
-        game_name: A string containing the name of the game.
-    """
-    notify2.Notification(
-        streamer_name + " @ " + time.strftime("%H:%M"),
-        "Streaming %s\nTitle: %s" % (game_name, stream_title),
-    ).show()
-
-
 def send_error_notification(error_message, send_dbus_notification):
     """Logs and notifies an error message.
 
@@ -54,8 +28,11 @@ def send_error_notification(error_message, send_dbus_notification):
     # Log the error
     logging.error(error_message)
 
-    # Send a notification about the error, if instructed to
+    # Send a notification about the error, if instructed to. Import
+    # notify2 here so it's only needed when using D-Bus.
     if send_dbus_notification:
+        import notify2  # pylint: disable=import-outside-toplevel
+
         notify2.Notification(
             NAME + " @ " + time.strftime("%H:%M"), error_message
         ).show()
@@ -105,6 +82,11 @@ def handle_failed_http_request(e, ignore_502s, print_to_terminal):
         print_to_terminal: A boolean signalling whether to
             print to the terminal instead of passing a message to D-Bus.
     """
+    trace("error", message=e.message, status=e.status_code)
+
+    # Keep the trace leading up to the error
+    TRACE.auto_dump("error")
+
     if (
         not ignore_502s
         or ignore_502s
@@ -113,24 +95,193 @@ def handle_failed_http_request(e, ignore_502s, print_to_terminal):
         send_error_notification(e.message, not print_to_terminal)
 
 
+def get_streamer_events(
+    streamer_login_name,
+    info,
+    filters,
+    streamers_previous_game,
+    streamers_previous_title_match,
+    watching_since=None,
+):
+    """Work out what's happened to a streamer's stream since last query.
+
+    This only decides what happened (updating the previous state
+    dictionaries to match); it doesn't send, record, or print anything,
+    beyond tracing its decisions if tracing is on.
+
+    Args:
+        filters: A StreamerFilter specifying what games and titles to
+            allow (or disallow) for the streamer.
+        info: A dictionary of information about the streamer's stream,
+            as returned by TwitchApi.get_online_stream_info.
+        streamer_login_name: A string containing the login name of the
+            streamer.
+        streamers_previous_game: A dictionary containing what game
+            each streamer was last seen playing, as in
+            process_notifications_for_streamer. Can be None.
+        streamers_previous_title_match: A dictionary containing whether
+            each streamer's title was last seen passing their title
+            filter, as in process_notifications_for_streamer. Must be
+            given along with streamers_previous_game.
+        watching_since: An optional number containing the Unix time we
+            started watching at. Notifications about streams which went
+            live since then include their detection latency. Defaults to
+            None, which leaves the latency out.
+
+    Returns:
+        A list containing a StreamTransition if the streamer went live,
+        went offline, or changed games (which can only be told when
+        streamers_previous_game is given), followed by a Notification if
+        the stream should be notified about.
+    """
+    events = []
+    now = clock.time()
+
+    # If the streamer isn't live, record that they aren't playing
+    # anything
+    if not info["live"]:
+        # Mark them as last seen playing nothing
+        if (
+            streamers_previous_game
+            and streamers_previous_game[streamer_login_name]
+        ):
+            streamers_previous_game[streamer_login_name] = ""
+            streamers_previous_title_match[streamer_login_name] = False
+            trace(
+                "transition",
+                streamer=streamer_login_name,
+                transition=TRANSITION_OFFLINE,
+            )
+
+            events.append(
+                StreamTransition(
+                    now, TRANSITION_OFFLINE, streamer_login_name, "", ""
+                )
+            )
+
+        return events
+
+    # Check if this is a game to notify about
+    game_id = info["game_id"]
+    game_name = info["game_name"]
+    title_allowed = filters.titles.allows(info["title"])
+    went_live = False
+
+    # If the streamer was last seen playing this game, move on unless
+    # their title has just started passing the title filter. If they
+    # are playing something new, record it.
+    if streamers_previous_game:
+        previous_game_id = streamers_previous_game[streamer_login_name]
+        previous_title_allowed = streamers_previous_title_match[
+            streamer_login_name
+        ]
+        streamers_previous_title_match[streamer_login_name] = title_allowed
+
+        if previous_game_id == game_id and (
+            previous_title_allowed or not title_allowed
+        ):
+            # The streamer is playing the same game as before
+            trace("decision", streamer=streamer_login_name, notify=False)
+
+            return events
+
+        # Streamer is playing something new (or has a newly matching
+        # title). Update the previously seen game.
+        streamers_previous_game[streamer_login_name] = game_id
+        went_live = not previous_game_id and bool(game_id)
+
+        if previous_game_id != game_id:
+            kind = TRANSITION_LIVE if went_live else TRANSITION_GAME_CHANGE
+
+            trace(
+                "transition",
+                streamer=streamer_login_name,
+                transition=kind,
+                game_id=game_id,
+            )
+
+            events.append(
+                StreamTransition(
+                    now, kind, streamer_login_name, game_id, game_name
+                )
+            )
+
+    # Check the include and exclude lists
+    game_allowed = filters.games.allows(game_id, game_name)
+
+    trace(
+        "decision",
+        streamer=streamer_login_name,
+        game_id=game_id,
+        game_allowed=game_allowed,
+        title_allowed=title_allowed,
+        notify=game_allowed and title_allowed,
+    )
+
+    if title_allowed and game_allowed:
+        # Streams started before we were watching were already live, so
+        # we don't know how long it took to notice them
+        if (
+            went_live
+            and watching_since is not None
+            and info["started_at"] >= watching_since
+        ):
+            latency = now - info["started_at"]
+        else:
+            latency = None
+
+        events.append(
+            Notification(
+                now,
+                streamer_login_name,
+                info["user_display_name"],
+                info["title"],
+                game_id,
+                game_name,
+                latency,
+            )
+        )
+
+    return events
+
+
 def process_notifications_for_streamer(
     streamer_login_name,
-    games,
+    filters,
     twitch_api,
+    sinks,
     ignore_502s,
     streamers_previous_game,
     print_to_terminal,
+    journal=None,
+    streamers_previous_title_match=None,
+    latency_tracker=None,
+    events_callback=None,
+    cycle=None,
 ):
     """Query the Twitch API for a spcific streamer and display notifications.
 
     Args:
+        cycle: An optional integer containing the number of the cycle
+            to batch notifications under, from sinks.start_cycle. Must
+            be given along with sinks.
+        events_callback: An optional function to call with each
+            StreamTransition and Notification made (see
+            get_streamer_events). Defaults to None.
         ignore_502s: A boolean signaling whether to ignore 502 errors when
             querying the Twitch API.
-        games: A dictionary containing information about what games to
-            allow (or disallow) for the streamer. See the configuration
-            file for how these look.
+        filters: A StreamerFilter specifying what games and titles to
+            allow (or disallow) for the streamer.
+        journal: An optional TransitionJournal to record the streamer's
+            transitions to. Defaults to None, which records nothing.
+        latency_tracker: An optional LatencyTracker to record the
+            detection latency of the streamer going live to. Defaults to
+            None, which records nothing and leaves the latency out of
+            notifications.
         print_to_terminal: A boolean signalling whether to
-            print to the terminal instead of passing a message to D-Bus.
+            print errors to the terminal instead of passing them to
+            D-Bus.
+        sinks: A SinkDispatcher to send notifications to, or None.
         streamer_login_name: A string containing the login name of the
             streamer to process notifications for.
         streamers_previous_game: A dictionary containing
@@ -139,8 +290,18 @@ def process_notifications_for_streamer(
             login name, and the keys are strings containing the game ID
             of what they were last seen playing (or an empty string if
             the streamer hasn't yet been seen live). Can be None.
+        streamers_previous_title_match: An optional dictionary
+            containing whether each streamer's title was last seen
+            passing their title filter. The keys are strings containing
+            the streamers login name. Must be given along with
+            streamers_previous_game.
         twitch_api: An authenticated TwitchApi object to interact with
             Twitch's API.
+
+    Returns:
+        The dictionary of information about the streamer's stream
+        returned by TwitchApi.get_online_stream_info, or None if the
+        query failed.
     """
     try:
         # Get info about stream
@@ -148,84 +309,349 @@ def process_notifications_for_streamer(
     except FailedHttpRequest as e:
         handle_failed_http_request(e, ignore_502s, print_to_terminal)
 
-        return
+        return None
+    except requests.exceptions.Timeout:
+        logging.warning("Timed out querying %s", streamer_login_name)
+        trace("timeout", streamer=streamer_login_name)
 
-    # If the streamer isn't live, record that they aren't playing
-    # anything and move onto the next streamer
-    if not info["live"]:
-        # Mark them as last seen playing nothing
-        if (
-            streamers_previous_game
-            and streamers_previous_game[streamer_login_name]
-        ):
-            streamers_previous_game[streamer_login_name] = ""
+        return None
 
-        return
+    events = get_streamer_events(
+        streamer_login_name,
+        info,
+        filters,
+        streamers_previous_game,
+        streamers_previous_title_match,
+        latency_tracker.started if latency_tracker is not None else None,
+    )
 
-    # Check if this is a game to notify about
-    game_id = info["game_id"]
-    game_name = info["game_name"]
+    for event in events:
+        if isinstance(event, StreamTransition):
+            if event.kind == TRANSITION_LIVE and latency_tracker is not None:
+                latency_tracker.record(info["started_at"], event.time)
 
-    # If the streamer was last seen playing this game, move on. If
-    # they are playing something new, record it.
-    if streamers_previous_game:
-        if streamers_previous_game[streamer_login_name] == game_id:
-            # The streamer is playing the same game as before
-            return
+            if journal is not None:
+                journal.record(event)
+        elif sinks is not None:
+            sinks.notify(event, cycle)
 
-        # Streamer is playing something new. Update the previously
-        # seen game.
-        streamers_previous_game[streamer_login_name] = game_id
+        if events_callback is not None:
+            events_callback(event)
 
-    # Check the include (and possibly exclude) list
-    if "*" in games["include"]:
-        # All games are included. Check if we need to exclude any
-        # games.
-        if "exclude" in games and (
-            game_id in games["exclude"] or game_name in games["exclude"]
-        ):
-            return
-    elif game_id not in games["include"] or game_name not in games["include"]:
-        # Game not in the include list
-        return
-
-    # Send a notification
-    if print_to_terminal:
-        print_notification_to_terminal(
-            info["user_display_name"], info["title"], info["game_name"]
+    return info
+
+
+def get_watched_games(twitch_api, games):
+    """Look up the IDs of the games to discover streams for.
+
+    Games Twitch doesn't know of are logged and left out.
+
+    Args:
+        games: A dictionary of games from the config file, where the
+            keys are strings containing game names and the values are
+            dictionaries containing the user's settings for the game.
+        twitch_api: An authenticated TwitchApi object to interact with
+            Twitch's API.
+
+    Returns:
+        A dictionary where the keys are strings containing game IDs and
+        the values are integers containing the fewest viewers a stream
+        needs to be notified about, as process_notifications takes.
+
+    Raises:
+        FailedHttpRequest: The lookup failed.
+        requests.exceptions.RequestException: Connecting to Twitch
+            failed.
+    """
+    if not games:
+        return {}
+
+    game_ids = twitch_api.get_game_ids(list(games))
+    watched_games = {}
+
+    for game, settings in games.items():
+        if game not in game_ids:
+            logging.warning("Couldn't find a game called %s", game)
+            continue
+
+        watched_games[game_ids[game][0]] = settings["min-viewers"]
+
+    return watched_games
+
+
+def get_game_streams(
+    game_id,
+    min_viewers,
+    twitch_api,
+    ignore_502s,
+    print_to_terminal,
+    deadline=None,
+):
+    """Query the Twitch API for a game's streams with enough viewers.
+
+    Args:
+        deadline: An optional float containing the clock.monotonic()
+            time to stop paging through streams at. Defaults to None,
+            which pages through every stream with enough viewers.
+        game_id: A string containing the ID of the game.
+        ignore_502s: A boolean signaling whether to ignore 502 errors when
+            querying the Twitch API.
+        min_viewers: An integer containing the fewest viewers a stream
+            needs to be included.
+        print_to_terminal: A boolean signalling whether to
+            print errors to the terminal instead of passing them to
+            D-Bus.
+        twitch_api: An authenticated TwitchApi object to interact with
+            Twitch's API.
+
+    Returns:
+        A tuple containing a dictionary and a boolean. The dictionary's
+        keys are strings containing the login names of the streamers
+        seen streaming the game, and its values are dictionaries of
+        information about their streams, as returned by
+        TwitchApi.parse_stream_data. The boolean specifies whether every
+        stream with enough viewers was seen, which isn't the case if the
+        deadline passed or a request failed.
+    """
+    streams = {}
+
+    try:
+        for info in twitch_api.iter_game_streams(game_id, min_viewers):
+            # Viewer counts can shift while paging, so the same stream
+            # might show up twice
+            streams.setdefault(info["user_login"], info)
+
+            if deadline is not None and clock.monotonic() > deadline:
+                logging.warning(
+                    "Query cycle deadline passed while paging game %s",
+                    game_id,
+                )
+
+                return streams, False
+    except FailedHttpRequest as e:
+        handle_failed_http_request(e, ignore_502s, print_to_terminal)
+
+        return streams, False
+    except requests.exceptions.Timeout:
+        logging.warning("Timed out querying streams of game %s", game_id)
+        trace("timeout", game_id=game_id)
+
+        return streams, False
+
+    return streams, True
+
+
+def update_games_state(games_state, snapshot, complete_games):
+    """Record who was seen streaming the games, and return who's new.
+
+    Args:
+        games_state: A dictionary containing which game each streamer
+            was last seen streaming with enough viewers. The keys are
+            strings containing streamers' login names and the values
+            are strings containing game IDs. This is updated to match
+            the snapshot.
+        snapshot: A dictionary in the same form as games_state
+            containing the streamers seen this query.
+        complete_games: A list of strings containing the IDs of the
+            games whose streams were all seen this query. Streamers last
+            seen streaming any other game who weren't seen this time
+            are kept as they were, so they aren't notified about again
+            once they're seen.
+
+    Returns:
+        A list of strings containing the login names of the streamers
+        in the snapshot who weren't last seen streaming the same game.
+    """
+    new_streamers = [
+        streamer_login_name
+        for streamer_login_name, game_id in snapshot.items()
+        if games_state.get(streamer_login_name) != game_id
+    ]
+
+    # Forget streamers who've stopped streaming a game seen in full
+    complete_games = set(complete_games)
+
+    for streamer_login_name in games_state.keys() - snapshot.keys():
+        if games_state[streamer_login_name] in complete_games:
+            del games_state[streamer_login_name]
+
+    games_state.update(snapshot)
+
+    return new_streamers
+
+
+def process_notifications_for_games(
+    games,
+    twitch_api,
+    sinks,
+    ignore_502s,
+    games_state,
+    print_to_terminal,
+    deadline=None,
+    events_callback=None,
+    cycle=None,
+):
+    """Query the Twitch API for games' streams and display notifications.
+
+    Notifies about each stream of the games with enough viewers whose
+    streamer wasn't seen streaming the same game in the previous query.
+
+    Args:
+        cycle: An optional integer containing the number of the cycle
+            to batch notifications under, from sinks.start_cycle. Must
+            be given along with sinks.
+        deadline: An optional float containing the clock.monotonic()
+            time by which to give up on whatever games are left.
+            Defaults to None, which never gives up.
+        events_callback: An optional function to call with each
+            Notification made. Defaults to None.
+        games: A dictionary of games to discover streams for, where the
+            keys are strings containing game IDs and the values are
+            integers containing the fewest viewers a stream needs to be
+            notified about.
+        games_state: A dictionary containing which game each streamer
+            was last seen streaming with enough viewers (see
+            update_games_state). Can be None.
+        ignore_502s: A boolean signaling whether to ignore 502 errors when
+            querying the Twitch API.
+        print_to_terminal: A boolean signalling whether to
+            print errors to the terminal instead of passing them to
+            D-Bus.
+        sinks: A SinkDispatcher to send notifications to, or None.
+        twitch_api: An authenticated TwitchApi object to interact with
+            Twitch's API.
+    """
+    streams = {}
+    snapshot = {}
+    complete_games = []
+
+    for game_id, min_viewers in games.items():
+        if deadline is not None and clock.monotonic() > deadline:
+            logging.warning(
+                "Query cycle deadline passed; skipping remaining games"
+            )
+            break
+
+        game_streams, complete = get_game_streams(
+            game_id,
+            min_viewers,
+            twitch_api,
+            ignore_502s,
+            print_to_terminal,
+            deadline,
         )
+
+        streams.update(game_streams)
+        snapshot.update(dict.fromkeys(game_streams, game_id))
+
+        if complete:
+            complete_games.append(game_id)
+
+    # Compare against the previous query all at once. Streamers of games
+    # which weren't seen in full are kept as they were, so they aren't
+    # notified about again next time.
+    if games_state is None:
+        new_streamers = list(snapshot)
     else:
-        send_notification_to_dbus(
-            info["user_display_name"], info["title"], info["game_name"]
+        new_streamers = update_games_state(
+            games_state, snapshot, complete_games
+        )
+
+    for streamer_login_name in new_streamers:
+        info = streams[streamer_login_name]
+
+        trace(
+            "decision",
+            streamer=streamer_login_name,
+            game_id=snapshot[streamer_login_name],
+            notify=True,
         )
 
+        notification = Notification(
+            clock.time(),
+            streamer_login_name,
+            info["user_display_name"],
+            info["title"],
+            info["game_id"],
+            info["game_name"],
+        )
+
+        if sinks is not None:
+            sinks.notify(notification, cycle)
+
+        if events_callback is not None:
+            events_callback(notification)
+
 
 def process_notifications(
     streamers,
     twitch_api,
+    sinks,
     ignore_502s,
     streamers_previous_game=None,
     print_to_terminal=False,
+    journal=None,
+    streamers_previous_title_match=None,
+    games=None,
+    games_state=None,
+    deadline=None,
+    live_streamers_callback=None,
+    latency_tracker=None,
+    events_callback=None,
+    streamers_order=None,
 ):
     """Query the Twitch API for all streamers and display notifications.
 
     The whole function is a big loop going over all the streamers present
-    in the config file.
+    in the config file, followed by a loop going over all the games to
+    discover streams for.
 
     Args:
+        deadline: An optional float containing the clock.monotonic()
+            time by which to give up on whatever is left of the cycle.
+            Defaults to None, which never gives up.
+        events_callback: An optional function to call with each
+            StreamTransition and Notification made. Defaults to None.
+        games: An optional dictionary of games to discover streams for,
+            where the keys are strings containing game IDs and the
+            values are integers containing the fewest viewers a stream
+            needs to be notified about. Defaults to None.
+        games_state: An optional dictionary containing which game each
+            streamer was last seen streaming with enough viewers (see
+            update_games_state). This
+            defaults to None, which is used when this function is only
+            being called once.
         ignore_502s: A boolean signaling whether to ignore 502 errors when
             querying the Twitch API.
+        journal: An optional TransitionJournal to record streamers'
+            transitions to. Defaults to None, which records nothing.
+        latency_tracker: An optional LatencyTracker to record the
+            detection latency of streamers going live to. Defaults to
+            None, which records nothing.
+        live_streamers_callback: An optional function to call once all
+            streamers have been processed. It's passed a dictionary
+            where the keys are strings containing the login names of
+            the streamers successfully queried and the values are
+            tuples containing the streamer's display name and the name
+            of the game they're streaming if they're live, or None if
+            they're offline. Defaults to None.
         print_to_terminal: An optional boolean signalling whether to
-            print to the terminal instead of passing a message to D-Bus.
-            Defaults to False.
+            print errors to the terminal instead of passing them to
+            D-Bus. Defaults to False.
+        sinks: A SinkDispatcher to send notifications to, or None. The
+            notifications made are handed off to the sinks in one batch
+            once all streamers have been processed.
         streamers: A dictionary of streamers where the keys are strings
             containing the streamer's login name and the values are
-            dictionaries containing the user's settings for the
-            streamer. For example:
-
-            {'shroud: {'include': ['Valorant']},
-             'hasanabi': {'include': ['*'], 'exclude': ['Just Chatting']},
-             'tyler1': {'include': ['*'], 'exclude': ['33214']}}
+            StreamerFilters compiled from the user's settings for the
+            streamer (see compile_streamer_filters).
+        streamers_order: An optional collections.deque containing the
+            login names of the streamers in the order to query them.
+            Streamers are rotated to the back once queried, so a cycle
+            cut short by the deadline is picked up where it stopped by
+            the next cycle, rather than the same streamers being
+            skipped every time. Defaults to None, which queries the
+            streamers in the order given.
         streamers_previous_game: An optional dictionary containing
             information about what game a streamer was last seen
             playing.  The keys are strings containing the streamers
@@ -234,19 +660,78 @@ def process_notifications(
             the streamer hasn't yet been seen live). This defaults to
             None, which is used when this function is only being called
             once.
+        streamers_previous_title_match: An optional dictionary
+            containing whether each streamer's title was last seen
+            passing their title filter. The keys are strings containing
+            the streamers login name. Must be given along with
+            streamers_previous_game. Defaults to None.
         twitch_api: An authenticated TwitchApi object to interact with
             Twitch's API.
     """
-    # Look up info about each streamer's stream
-    for streamer_login_name, games_dict in streamers.items():
-        process_notifications_for_streamer(
-            streamer_login_name,
-            games_dict,
+    live_streamers = {}
+    cycle = sinks.start_cycle() if sinks is not None else None
+
+    TRACE.start_cycle()
+
+    if streamers_order is None:
+        streamers_order = collections.deque(streamers)
+
+    try:
+        # Look up info about each streamer's stream, picking up where
+        # the last cycle stopped
+        for streamer_login_name in list(streamers_order):
+            if deadline is not None and clock.monotonic() > deadline:
+                logging.warning(
+                    "Query cycle deadline passed; skipping remaining "
+                    "streamers"
+                )
+                break
+
+            streamers_order.rotate(-1)
+
+            info = process_notifications_for_streamer(
+                streamer_login_name,
+                streamers[streamer_login_name],
+                twitch_api,
+                sinks,
+                ignore_502s,
+                streamers_previous_game,
+                print_to_terminal,
+                journal,
+                streamers_previous_title_match,
+                latency_tracker,
+                events_callback,
+                cycle,
+            )
+
+            if info is not None:
+                live_streamers[streamer_login_name] = (
+                    (info["user_display_name"], info["game_name"])
+                    if info["live"]
+                    else None
+                )
+
+        if live_streamers_callback is not None:
+            live_streamers_callback(live_streamers)
+
+        # Look for new streams of each game
+        process_notifications_for_games(
+            games or {},
             twitch_api,
+            sinks,
             ignore_502s,
-            streamers_previous_game,
+            games_state,
             print_to_terminal,
+            deadline,
+            events_callback,
+            cycle,
         )
+    finally:
+        # Send off this cycle's notifications
+        if sinks is not None:
+            sinks.end_cycle(cycle)
+
+        trace("cycle-end")
 
 
 def process_notifications_wrapper(*args, **kwargs):
@@ -0,0 +1,237 @@
+"""Contains sessions for recording and replaying Twitch API responses.
+
+A cassette is a JSON lines file. Its first line is a header recording
+when the session started and its query period; every other line is an
+HTTP exchange:
+
+    {"time": ..., "method": "GET", "url": ..., "status": 200,
+     "headers": {...}, "body": "..."}
+
+Credentials are never written to a cassette: the query string of the
+token URL (which holds the client secret) is dropped, and access tokens
+in responses are replaced.
+
+When replaying, each request gets the next recorded response for the
+same method and URL, and the virtual clock is moved forward to when
+that response was recorded. Replaying a cassette with the same config
+it was recorded with therefore makes the same decisions, in order, at
+the same (virtual) times, as fast as the machine allows.
+"""
+
+import collections
+import json
+import threading
+import requests
+from twitchgamenotify import clock
+from twitchgamenotify.constants import (
+    CASSETTE_VERSION,
+    REPLAY_REDACTED,
+    TWITCH_TOKEN_API_URL,
+)
+
+
+# Response headers worth keeping in a cassette
+RECORDED_HEADERS = (
+    "Content-Type",
+    "Ratelimit-Limit",
+    "Ratelimit-Remaining",
+    "Ratelimit-Reset",
+)
+
+
+class CassetteExhausted(Exception):
+    """Raised when a replayed request has no recorded responses left."""
+
+
+def redact_url(url):
+    """Remove credentials from a URL.
+
+    Arg:
+        url: A string containing a URL requested.
+
+    Returns:
+        A string containing the URL without any credentials in it.
+    """
+    if url.startswith(TWITCH_TOKEN_API_URL):
+        return TWITCH_TOKEN_API_URL
+
+    return url
+
+
+def redact_body(body):
+    """Remove credentials from a response body.
+
+    Arg:
+        body: A string containing a response body.
+
+    Returns:
+        A string containing the response body without any access token
+        in it.
+    """
+    try:
+        body_json = json.loads(body)
+    except ValueError:
+        return body
+
+    if isinstance(body_json, dict) and "access_token" in body_json:
+        body_json["access_token"] = REPLAY_REDACTED
+        return json.dumps(body_json)
+
+    return body
+
+
+class RecordingSession(requests.Session):
+    """A requests session which records every response to a cassette."""
+
+    def __init__(self, cassette_path, query_period):
+        """Open the cassette and write its header.
+
+        Args:
+            cassette_path: A string containing the path of the cassette
+                to write.
+            query_period: A number containing the query period being
+                used, in seconds.
+        """
+        super().__init__()
+
+        self._lock = threading.Lock()
+        self._cassette = open(cassette_path, "w", encoding="utf-8")
+        self._cassette.write(
+            json.dumps(
+                {
+                    "version": CASSETTE_VERSION,
+                    "start": clock.time(),
+                    "query-period": query_period,
+                }
+            )
+            + "\n"
+        )
+
+    def request(self, method, url, *args, **kwargs):
+        """Make a request and record its response."""
+        response = super().request(method, url, *args, **kwargs)
+
+        exchange = {
+            "time": clock.time(),
+            "method": method.upper(),
+            "url": redact_url(url),
+            "status": response.status_code,
+            "headers": {
+                h: response.headers[h]
+                for h in RECORDED_HEADERS
+                if h in response.headers
+            },
+            "body": redact_body(response.text),
+        }
+
+        with self._lock:
+            self._cassette.write(json.dumps(exchange) + "\n")
+
+        return response
+
+    def close(self):
+        """Close the session and the cassette."""
+        super().close()
+
+        with self._lock:
+            if not self._cassette.closed:
+                self._cassette.close()
+
+
+class ReplaySession(requests.Session):
+    """A requests session which replays responses from a cassette."""
+
+    def __init__(self, cassette_path):
+        """Load the cassette.
+
+        Arg:
+            cassette_path: A string containing the path of the cassette
+                to replay.
+        """
+        super().__init__()
+
+        with open(cassette_path, "r", encoding="utf-8") as cassette:
+            self.header = json.loads(cassette.readline())
+
+            # (method, url) -> recorded exchanges, in order
+            self._exchanges = collections.defaultdict(collections.deque)
+
+            for line in cassette:
+                if not line.strip():
+                    continue
+
+                exchange = json.loads(line)
+                key = (exchange["method"], exchange["url"])
+                self._exchanges[key].append(exchange)
+
+    @property
+    def start(self):
+        """The Unix time the recorded session started."""
+        return self.header["start"]
+
+    @property
+    def query_period(self):
+        """The query period the recorded session used, in seconds."""
+        return self.header["query-period"]
+
+    def request(self, method, url, **_):  # pylint: disable=arguments-differ
+        """Return the next recorded response for a request.
+
+        Anything else that would shape a real request (parameters,
+        timeouts, and so on) is ignored; the URL alone picks the
+        response.
+
+        Raises:
+            CassetteExhausted: There are no recorded responses left for
+                the request.
+        """
+        exchanges = self._exchanges.get((method.upper(), redact_url(url)))
+
+        if not exchanges:
+            raise CassetteExhausted("%s %s" % (method.upper(), url))
+
+        exchange = exchanges.popleft()
+
+        # Catch the clock up to when the response came in
+        virtual_clock = clock.get_clock()
+
+        if isinstance(virtual_clock, clock.VirtualClock):
+            virtual_clock.advance_to(exchange["time"])
+
+        response = requests.Response()
+        response.status_code = exchange["status"]
+        response.headers.update(exchange["headers"])
+        body = exchange["body"].encode("utf-8")
+        response._content = body  # pylint: disable=protected-access
+        response.encoding = "utf-8"
+        response.url = url
+
+        return response
+
+
+def run_replay(function, start, query_period, **kwargs):
+    """Run query cycles against a replayed cassette until it runs out.
+
+    Cycles are started every query period on the virtual clock, just
+    like they were when the cassette was recorded.
+
+    Args:
+        function: The function to run each cycle with.
+        start: A number containing the Unix time the cassette starts at.
+        query_period: A number containing the query period, in seconds.
+        **kwargs: Keyword arguments to pass to the function.
+
+    Returns:
+        An integer containing how many cycles were run.
+    """
+    cycle = 0
+
+    while True:
+        clock.get_clock().advance_to(start + cycle * query_period)
+
+        try:
+            function(**kwargs)
+        except CassetteExhausted:
+            return cycle
+
+        cycle += 1
@@ -0,0 +1,136 @@
+"""Contains a runner for periodic query cycles.
+
+Each cycle gets a deadline by which it should wrap up, and cycles run
+on a fixed number of worker threads rather than in a new thread each.
+If a cycle is still running when the next one is due, the next one is
+skipped instead of piling up behind it, and a watchdog thread reports
+any cycle that keeps running well past its deadline.
+
+The workers are daemon threads, so exiting never waits for a cycle in
+progress (which could take the whole deadline and then some).
+"""
+
+import logging
+import queue
+import threading
+from twitchgamenotify import clock
+from twitchgamenotify.constants import (
+    CYCLE_DEADLINE,
+    CYCLE_WORKERS,
+    HTTP_TIMEOUT,
+    WATCHDOG_INTERVAL,
+)
+
+
+class CycleRunner:
+    """Runs query cycles on a fixed number of daemon worker threads."""
+
+    def __init__(self, deadline=CYCLE_DEADLINE):
+        """Start the workers and the watchdog.
+
+        Arg:
+            deadline: An optional number containing how many seconds a
+                cycle has to finish.
+        """
+        self.deadline = deadline
+
+        # A cycle gives up at its deadline once its current request
+        # finishes, which (with a token refresh and a retry) can take
+        # a few request timeouts
+        self.stuck_after = deadline + 3 * sum(HTTP_TIMEOUT)
+
+        # Cycles waiting for a worker, as tuples of the function to run
+        # and its keyword arguments. None tells a worker to stop.
+        self._cycles = queue.Queue()
+
+        # Cycles currently submitted, mapped to the time they started
+        self._running = {}
+        self._running_lock = threading.Lock()
+
+        self._workers = [
+            threading.Thread(
+                target=self._work, name="cycle-%d" % i, daemon=True
+            )
+            for i in range(CYCLE_WORKERS)
+        ]
+
+        for worker in self._workers:
+            worker.start()
+
+        self._stop_event = threading.Event()
+        self._watchdog = threading.Thread(target=self._watch, daemon=True)
+        self._watchdog.start()
+
+    def run_cycle(self, function, **kwargs):
+        """Run a cycle unless too many are still running.
+
+        Args:
+            function: The function to run the cycle with. It's passed
+                the given keyword arguments along with a deadline
+                keyword argument containing the clock.monotonic() time
+                at which to give up.
+            **kwargs: Keyword arguments to pass to the function.
+
+        Returns:
+            A boolean specifying whether the cycle was started.
+        """
+        with self._running_lock:
+            if len(self._running) >= CYCLE_WORKERS:
+                logging.warning(
+                    "Previous query cycle still running; skipping this one"
+                )
+                return False
+
+            started = clock.monotonic()
+            kwargs["deadline"] = started + self.deadline
+            cycle = (function, kwargs)
+            self._running[id(cycle)] = started
+
+        self._cycles.put(cycle)
+
+        return True
+
+    def shutdown(self):
+        """Stop the watchdog and the workers without waiting.
+
+        A cycle in progress is left to be cut short when we exit.
+        """
+        self._stop_event.set()
+
+        for _ in self._workers:
+            self._cycles.put(None)
+
+    def _work(self):
+        """Run cycles as they come in until told to stop."""
+        while True:
+            cycle = self._cycles.get()
+
+            if cycle is None:
+                return
+
+            function, kwargs = cycle
+
+            try:
+                function(**kwargs)
+            except Exception:  # pylint: disable=broad-except
+                logging.exception("Query cycle failed")
+            finally:
+                # Forget about the finished cycle
+                with self._running_lock:
+                    self._running.pop(id(cycle), None)
+
+    def _watch(self):
+        """Periodically report cycles which are stuck."""
+        while not self._stop_event.wait(WATCHDOG_INTERVAL):
+            now = clock.monotonic()
+
+            with self._running_lock:
+                running_times = [now - s for s in self._running.values()]
+
+            for running_time in running_times:
+                if running_time > self.stuck_after:
+                    logging.warning(
+                        "Query cycle stuck for %ds (%d threads alive)",
+                        running_time,
+                        threading.active_count(),
+                    )
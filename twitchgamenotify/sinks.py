@@ -0,0 +1,308 @@
+"""Contains the places notifications can be sent to.
+
+Notifications made during a query cycle are collected into a single
+batch, which is handed off to each sink at the end of the cycle. Every
+sink runs in its own thread, so a slow sink (say, a webhook that takes a
+while to respond) never holds up querying Twitch or the other sinks.
+"""
+
+import abc
+import datetime
+import itertools
+import json
+import logging
+import queue
+import sys
+import threading
+import time
+import requests
+from twitchgamenotify.constants import (
+    SINK_CLOSE_TIMEOUT,
+    SINK_QUEUE_SIZE,
+    WEBHOOK_TIMEOUT,
+)
+
+
+# ANSI escape sequence for bold text
+ANSI_BOLD = "\033[1m"
+ANSI_END = "\033[0m"
+
+
+def notification_to_dict(notification):
+    """Convert a notification to a JSON-serializable dictionary.
+
+    Arg:
+        notification: A Notification to convert.
+
+    Returns:
+        A dictionary containing the notification's fields, with the time
+        as an ISO 8601 string.
+    """
+    notification_dict = notification._asdict()
+    notification_dict["time"] = datetime.datetime.fromtimestamp(
+        notification.time, datetime.timezone.utc
+    ).isoformat()
+
+    return notification_dict
+
+
+class NotificationSink(abc.ABC):
+    """Base class for places to send notifications to."""
+
+    @abc.abstractmethod
+    def send(self, notifications):
+        """Send a batch of notifications.
+
+        Arg:
+            notifications: A non-empty list of Notifications.
+        """
+
+    def close(self):
+        """Release anything the sink holds on to."""
+
+
+class TerminalSink(NotificationSink):
+    """Prints notifications to the terminal."""
+
+    def send(self, notifications):
+        """Print a batch of notifications with a single write."""
+        sys.stdout.write(
+            "".join(
+                "%s%s%s @ %s\nStreaming %s\nTitle: %s\n"
+                % (
+                    ANSI_BOLD,
+                    n.user_display_name,
+                    ANSI_END,
+                    datetime.datetime.fromtimestamp(n.time).isoformat(),
+                    n.game_name,
+                    n.title,
+                )
+                for n in notifications
+            )
+        )
+        sys.stdout.flush()
+
+
+class DbusSink(NotificationSink):
+    """Sends notifications to D-Bus."""
+
+    def __init__(self, icons=None):
+        """Set up where icons come from.
+
+        Arg:
+            icons: An optional IconFetcher to get each notification's
+                icon from: the streamer's avatar, or failing that the
+                game's box art. Defaults to None, which shows no icons.
+        """
+        self.icons = icons
+
+    def get_icon(self, notification):
+        """Return the path of a notification's icon, or an empty string.
+
+        This never waits on an icon to be fetched.
+        """
+        if self.icons is None:
+            return ""
+
+        return (
+            self.icons.get_streamer_icon(notification.streamer_login)
+            or self.icons.get_game_icon(notification.game_id)
+            or ""
+        )
+
+    def send(self, notifications):
+        """Show each notification in a batch."""
+        # Import notify2 here so it's only needed when using D-Bus
+        import notify2  # pylint: disable=import-outside-toplevel
+
+        for n in notifications:
+            notify2.Notification(
+                n.user_display_name
+                + " @ "
+                + time.strftime("%H:%M", time.localtime(n.time)),
+                "Streaming %s\nTitle: %s" % (n.game_name, n.title),
+                self.get_icon(n),
+            ).show()
+
+
+class JsonLinesSink(NotificationSink):
+    """Writes notifications as JSON lines to stdout or a file."""
+
+    def __init__(self, path):
+        """Open the output.
+
+        Arg:
+            path: A string containing the path of the file to append to,
+                or "-" for stdout.
+        """
+        if path == "-":
+            self.file = sys.stdout
+        else:
+            self.file = open(path, "a", encoding="utf-8")
+
+    def send(self, notifications):
+        """Write a batch of notifications with a single write."""
+        self.file.write(
+            "".join(
+                json.dumps(notification_to_dict(n)) + "\n"
+                for n in notifications
+            )
+        )
+        self.file.flush()
+
+    def close(self):
+        """Close the output file (but not stdout)."""
+        if self.file is not sys.stdout:
+            self.file.close()
+
+
+class WebhookSink(NotificationSink):
+    """POSTs notifications as a JSON array to a URL."""
+
+    def __init__(self, url):
+        """Set up a session for the webhook.
+
+        Arg:
+            url: A string containing the URL to POST to.
+        """
+        self.url = url
+        self.session = requests.Session()
+
+    def send(self, notifications):
+        """POST a batch of notifications in a single request."""
+        try:
+            response = self.session.post(
+                self.url,
+                json=[notification_to_dict(n) for n in notifications],
+                timeout=WEBHOOK_TIMEOUT,
+            )
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            logging.error("Webhook POST to %s failed: %s", self.url, e)
+
+    def close(self):
+        """Close the webhook's session."""
+        self.session.close()
+
+
+class SinkDispatcher:
+    """Fans notifications out to sinks, each in its own thread."""
+
+    def __init__(self, sinks):
+        """Start a thread for each sink.
+
+        Arg:
+            sinks: A list of NotificationSinks to send notifications to.
+        """
+        self.sinks = sinks
+
+        # Cycle number -> notifications made during the cycle. Cycles
+        # can overlap, so each gets its own batch.
+        self._batches = {}
+        self._batch_lock = threading.Lock()
+        self._cycle_numbers = itertools.count()
+
+        self._queues = []
+        self._threads = []
+
+        for sink in sinks:
+            sink_queue = queue.Queue(maxsize=SINK_QUEUE_SIZE)
+            thread = threading.Thread(
+                target=self._run_sink, args=(sink, sink_queue), daemon=True
+            )
+            thread.start()
+
+            self._queues.append(sink_queue)
+            self._threads.append(thread)
+
+    def start_cycle(self):
+        """Start a batch for a new cycle.
+
+        Returns:
+            An integer containing the cycle's number, to pass to notify
+            and end_cycle.
+        """
+        with self._batch_lock:
+            cycle = next(self._cycle_numbers)
+            self._batches[cycle] = []
+
+        return cycle
+
+    def notify(self, notification, cycle):
+        """Add a notification to a cycle's batch.
+
+        Args:
+            notification: A Notification to send.
+            cycle: An integer containing the cycle's number.
+        """
+        with self._batch_lock:
+            self._batches[cycle].append(notification)
+
+    def end_cycle(self, cycle):
+        """Hand a cycle's batch off to the sinks.
+
+        Arg:
+            cycle: An integer containing the cycle's number.
+        """
+        with self._batch_lock:
+            batch = self._batches.pop(cycle, None)
+
+        if not batch:
+            return
+
+        self._dispatch(batch)
+
+    def _dispatch(self, batch):
+        """Queue a batch for each sink, dropping it for any falling behind."""
+        for sink, sink_queue in zip(self.sinks, self._queues):
+            try:
+                sink_queue.put_nowait(batch)
+            except queue.Full:
+                logging.warning(
+                    "%s is falling behind; dropping %d notifications",
+                    type(sink).__name__,
+                    len(batch),
+                )
+
+    def close(self):
+        """Send anything outstanding and shut down the sinks."""
+        with self._batch_lock:
+            batches, self._batches = self._batches, {}
+
+        batch = [n for cycle in sorted(batches) for n in batches[cycle]]
+
+        if batch:
+            self._dispatch(batch)
+
+        # Tell each sink thread to stop once its queue is drained. A
+        # sink whose queue stays full is left to die with the program
+        # rather than holding up exiting.
+        for sink, sink_queue in zip(self.sinks, self._queues):
+            try:
+                sink_queue.put(None, timeout=SINK_CLOSE_TIMEOUT)
+            except queue.Full:
+                logging.warning(
+                    "%s is still busy; not waiting for it to finish",
+                    type(sink).__name__,
+                )
+
+        for thread in self._threads:
+            thread.join(SINK_CLOSE_TIMEOUT)
+
+    @staticmethod
+    def _run_sink(sink, sink_queue):
+        """Send batches to a sink until told to stop."""
+        while True:
+            batch = sink_queue.get()
+
+            if batch is None:
+                break
+
+            try:
+                sink.send(batch)
+            except Exception:  # pylint: disable=broad-except
+                logging.exception(
+                    "%s failed to send notifications", type(sink).__name__
+                )
+
+        sink.close()
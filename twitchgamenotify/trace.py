@@ -0,0 +1,190 @@
+"""Contains an in-memory ring buffer of trace events.
+
+Requests, their status codes and timings, state transitions, and
+notification decisions are all recorded here as they happen, grouped by
+query cycle, and only the last few cycles are kept. Recording an event
+only appends a tuple to a fixed-size deque, so the command leaves
+tracing on; nothing is formatted or written anywhere until the buffer is
+dumped, which happens on SIGUSR1 or after a failed HTTP request.
+
+Tracing starts off, so programs using twitch-game-notify as a library
+don't trace (or write dumps) unless they turn it on.
+
+Dumps are JSON lines files, one event per line:
+
+    {"time": ..., "kind": "request", "url": ..., "status": 200, ...}
+"""
+
+import collections
+import datetime
+import json
+import logging
+import os
+import threading
+from twitchgamenotify import clock
+from twitchgamenotify.constants import (
+    TRACE_AUTO_DUMP_INTERVAL,
+    TRACE_CYCLE_CAPACITY,
+    TRACE_CYCLES,
+    TRACE_DIR,
+)
+
+
+class TraceBuffer:
+    """A buffer of the trace events of the most recent query cycles."""
+
+    def __init__(
+        self, cycles=TRACE_CYCLES, capacity=TRACE_CYCLE_CAPACITY, enabled=True
+    ):
+        """Set up the buffer.
+
+        Args:
+            cycles: An optional integer containing how many cycles'
+                events to keep.
+            capacity: An optional integer containing how many events to
+                keep per cycle, the most recent ones being kept.
+            enabled: An optional boolean specifying whether to record
+                events (and dump them automatically). This can be
+                changed later through the enabled attribute.
+        """
+        self.capacity = capacity
+        self.enabled = enabled
+
+        # Each cycle's events, oldest cycle first. Events recorded
+        # before the first cycle get a cycle of their own. Appending to
+        # a deque is thread-safe, so recording needs no lock.
+        self._cycles = collections.deque(
+            [collections.deque(maxlen=capacity)], maxlen=cycles
+        )
+
+        self._dump_lock = threading.Lock()
+        self._last_auto_dump = None
+
+    def record(self, kind, **fields):
+        """Record a trace event.
+
+        Args:
+            kind: A string containing what kind of event this is.
+            **fields: Anything else worth knowing about the event. These
+                must be JSON-serializable.
+        """
+        if self.enabled:
+            self._cycles[-1].append((clock.time(), kind, fields))
+
+    def start_cycle(self):
+        """Start recording a new cycle's events, forgetting the oldest.
+
+        This records a cycle-start event.
+        """
+        if not self.enabled:
+            return
+
+        self._cycles.append(collections.deque(maxlen=self.capacity))
+        self.record("cycle-start")
+
+    def dump(self, path):
+        """Write the buffered events to a file.
+
+        Arg:
+            path: A string containing the path of the file to write.
+        """
+        # Copy the events first so recording can carry on. Each copy is
+        # made by list in one go, without running any Python code in
+        # between, so no other thread can append to a deque mid-copy
+        # (which would make iterating over it raise RuntimeError).
+        cycles = [list(cycle) for cycle in list(self._cycles)]
+        events = [event for cycle in cycles for event in cycle]
+
+        with open(path, "w", encoding="utf-8") as dump_file:
+            dump_file.write(
+                "".join(
+                    json.dumps(dict(time=time, kind=kind, **fields)) + "\n"
+                    for time, kind, fields in events
+                )
+            )
+
+    def dump_to_trace_dir(self, reason):
+        """Write the buffered events to a new file in the trace directory.
+
+        Arg:
+            reason: A string containing why the dump is happening, which
+                is included in the file name.
+
+        Returns:
+            A string containing the path of the dump, or None if it
+            couldn't be written.
+        """
+        path = os.path.join(
+            TRACE_DIR,
+            "trace-%s-%s.jsonl"
+            % (datetime.datetime.now().strftime("%Y%m%d-%H%M%S"), reason),
+        )
+
+        with self._dump_lock:
+            try:
+                os.makedirs(TRACE_DIR, exist_ok=True)
+                self.dump(path)
+            except OSError as e:
+                logging.error("Unable to dump trace: %s", e)
+                return None
+
+        logging.info("Dumped trace to %s", path)
+
+        return path
+
+    def dump_in_background(self, reason):
+        """Dump the buffer to the trace directory from another thread.
+
+        This is safe to call from a signal handler, which could have
+        interrupted a dump holding the dump lock.
+
+        Arg:
+            reason: A string containing why the dump is happening.
+
+        Returns:
+            The threading.Thread doing the dump.
+        """
+        thread = threading.Thread(
+            target=self.dump_to_trace_dir, args=(reason,), daemon=True
+        )
+        thread.start()
+
+        return thread
+
+    def auto_dump(self, reason):
+        """Dump the buffer, unless it was auto-dumped only recently.
+
+        Nothing is dumped while tracing is off.
+
+        Arg:
+            reason: A string containing why the dump is happening.
+        """
+        if not self.enabled:
+            return
+
+        now = clock.monotonic()
+
+        with self._dump_lock:
+            if (
+                self._last_auto_dump is not None
+                and now - self._last_auto_dump < TRACE_AUTO_DUMP_INTERVAL
+            ):
+                return
+
+            self._last_auto_dump = now
+
+        self.dump_to_trace_dir(reason)
+
+
+# The buffer used throughout the program, off until turned on
+TRACE = TraceBuffer(enabled=False)
+
+
+def trace(kind, **fields):
+    """Record a trace event in the program's trace buffer.
+
+    Args:
+        kind: A string containing what kind of event this is.
+        **fields: Anything else worth knowing about the event.
+    """
+    TRACE.record(kind, **fields)
@@ -4,14 +4,23 @@ Specifically, the "new Twitch API", which they haven't put a version
 number on yet (so far as I can tell).
 """
 
+import datetime
+import urllib.parse
 import requests
+from twitchgamenotify import clock
 from twitchgamenotify.constants import (
     HTTP_200_OK,
     HTTP_400_BAD_REQUEST,
     HTTP_401_UNAUTHORIZED,
+    HTTP_TIMEOUT,
+    TWITCH_API_PAGE_SIZE,
+    TWITCH_API_TIME_FORMAT,
+    TWITCH_GAME_API_URL,
     TWITCH_STREAM_API_URL,
     TWITCH_TOKEN_API_URL,
+    TWITCH_USER_API_URL,
 )
+from twitchgamenotify.trace import trace
 
 
 class FailedHttpRequest(Exception):
@@ -34,14 +43,36 @@ class AuthenticationFailed(FailedHttpRequest):
 class TwitchApi:
     """Interacts with the Twitch API."""
 
-    def __init__(self, client_id, client_secret):
-        """Set up authorization."""
+    def __init__(
+        self, client_id, client_secret, timeout=HTTP_TIMEOUT, session=None
+    ):
+        """Set up authorization.
+
+        Args:
+            client_id: A string containing the Twitch API client ID.
+            client_secret: A string containing the Twitch API client
+                secret.
+            timeout: An optional tuple containing the connect and read
+                timeouts, in seconds, to use for every HTTP request.
+            session: An optional requests.Session to make every HTTP
+                request with (for example, one which records or replays
+                responses). Defaults to a new requests.Session.
+        """
         # Load in authentication details
         self.client_id = client_id
         self.client_secret = client_secret
+        self.timeout = timeout
+
+        # How many requests have been made to the API, and what the
+        # API last said about our rate limit (points per minute, points
+        # remaining, and the Unix time the points refill at)
+        self.request_count = 0
+        self.ratelimit_limit = None
+        self.ratelimit_remaining = None
+        self.ratelimit_reset = None
 
         # Start a requests session
-        self.session = requests.Session()
+        self.session = session if session is not None else requests.Session()
 
         # Get and set an access token
         self.obtain_access_token()
@@ -49,14 +80,16 @@ class TwitchApi:
     def obtain_access_token(self):
         """Obtains and sets a fresh access token."""
         # Get the access token
-        response = requests.post(
+        response = self.session.post(
             TWITCH_TOKEN_API_URL
             + "?client_id="
             + self.client_id
             + "&client_secret="
             + self.client_secret
-            + "&grant_type=client_credentials"
+            + "&grant_type=client_credentials",
+            timeout=self.timeout,
         )
+        trace("token", status=response.status_code)
 
         try:
             # Make sure the HTTP request was okay
@@ -92,7 +125,7 @@ class TwitchApi:
             }
         )
 
-    def make_http_request(self, http_request_url):
+    def make_http_request(self, http_request_url, counted=True):
         """Makes an HTTP request.
 
         This assumes that all incoming HTTP requests are GETs, which
@@ -102,9 +135,13 @@ class TwitchApi:
         If the current access token has expired during a call to this
         method, a fresh access token is obtained.
 
-        Arg:
+        Args:
             http_request_url: A string containing the URL to make an
                 HTTP request to.
+            counted: An optional boolean specifying whether to count the
+                request in request_count. Requests made on the side (for
+                notification icons) aren't, so they don't throw off the
+                query period tuner's requests per cycle.
 
         Returns:
             A requests.models.Response object containing the response to
@@ -113,9 +150,13 @@ class TwitchApi:
         Raises:
             FailedHttpRequest: The status code indicated the HTTP
                 request was not successful.
+            requests.exceptions.Timeout: The server took too long to
+                connect or respond.
         """
         # Make the request
-        response = self.session.get(http_request_url)
+        started = clock.monotonic()
+        response = self.session.get(http_request_url, timeout=self.timeout)
+        self.record_request(response, http_request_url, started, counted)
 
         # If our access token has expired, get another one and retry the
         # request
@@ -124,7 +165,9 @@ class TwitchApi:
             self.obtain_access_token()
 
             # Repeat the request
-            response = self.session.get(http_request_url)
+            started = clock.monotonic()
+            response = self.session.get(http_request_url, timeout=self.timeout)
+            self.record_request(response, http_request_url, started, counted)
 
         try:
             # Make sure the HTTP request was okay
@@ -142,6 +185,39 @@ class TwitchApi:
 
         return response
 
+    def record_request(
+        self, response, http_request_url, started, counted=True
+    ):
+        """Count and trace a request and record its rate limit info.
+
+        Args:
+            response: A requests.models.Response object from the API.
+            http_request_url: A string containing the URL requested.
+            started: A float containing the clock.monotonic() time the
+                request was made at.
+            counted: An optional boolean specifying whether to count the
+                request in request_count.
+        """
+        if counted:
+            self.request_count += 1
+
+        trace(
+            "request",
+            url=http_request_url,
+            status=response.status_code,
+            elapsed=clock.monotonic() - started,
+            ratelimit_remaining=response.headers.get("Ratelimit-Remaining"),
+        )
+
+        try:
+            self.ratelimit_limit = int(response.headers["Ratelimit-Limit"])
+            self.ratelimit_remaining = int(
+                response.headers["Ratelimit-Remaining"]
+            )
+            self.ratelimit_reset = int(response.headers["Ratelimit-Reset"])
+        except (KeyError, ValueError):
+            pass
+
     def get_online_stream_info(self, streamer_login_name):
         """Requests info about an online stream.
 
@@ -158,6 +234,7 @@ class TwitchApi:
             - the streamer's display name
             - the game's name
             - the game's ID
+            - the Unix time the stream started at (None if offline)
 
             For example:
 
@@ -165,7 +242,8 @@ class TwitchApi:
              'title': "Testing TAS-Only Glitch | State of Play @ 2PM PST",
              'user_display_name': 'Distortion2',
              'game_name': 'Little Nightmares II',
-             'game_id': ''}
+             'game_id': '',
+             'started_at': 1613757782.0}
         """
         # Make a request to the Twitch API
         response = self.make_http_request(
@@ -183,14 +261,199 @@ class TwitchApi:
                 user_display_name="",
                 game_name="",
                 game_id="",
+                started_at=None,
             )
         else:
-            stream_info = dict(
-                live=True,
-                title=response_data[0]["title"],
-                user_display_name=response_data[0]["user_name"],
-                game_name=response_data[0]["game_name"],
-                game_id=response_data[0]["game_id"],
-            )
+            stream_info = self.parse_stream_data(response_data[0])
 
         return stream_info
+
+    @staticmethod
+    def parse_stream_data(stream_data):
+        """Build up the info of a live stream from the Twitch API's data.
+
+        Arg:
+            stream_data: A dictionary containing a stream object from
+                the Twitch API's streams endpoint.
+
+        Returns:
+            A dictionary of information about the stream, as in
+            get_online_stream_info, but also including the streamer's
+            login name and the stream's viewer count. For example:
+
+            {'live': True,
+             'title': "Testing TAS-Only Glitch | State of Play @ 2PM PST",
+             'user_login': 'distortion2',
+             'user_display_name': 'Distortion2',
+             'game_name': 'Little Nightmares II',
+             'game_id': '',
+             'started_at': 1613757782.0,
+             'viewer_count': 4242}
+        """
+        started_at = (
+            datetime.datetime.strptime(
+                stream_data["started_at"], TWITCH_API_TIME_FORMAT
+            )
+            .replace(tzinfo=datetime.timezone.utc)
+            .timestamp()
+        )
+
+        return dict(
+            live=True,
+            title=stream_data["title"],
+            user_login=stream_data["user_login"],
+            user_display_name=stream_data["user_name"],
+            game_name=stream_data["game_name"],
+            game_id=stream_data["game_id"],
+            started_at=started_at,
+            viewer_count=stream_data["viewer_count"],
+        )
+
+    def iter_game_streams(self, game_id, min_viewers):
+        """Iterates over the live streams of a game with enough viewers.
+
+        The Twitch API sorts streams by viewer count (most first), so
+        pages are only requested until a stream below the viewer
+        threshold comes up.
+
+        Args:
+            game_id: A string containing the ID of the game.
+            min_viewers: An integer containing the fewest viewers a
+                stream can have to be included.
+
+        Yields:
+            Dictionaries of information about each stream, as returned
+            by parse_stream_data. Since viewer counts change while
+            paging, a stream can occasionally be yielded twice.
+
+        Raises:
+            FailedHttpRequest: A page couldn't be fetched.
+        """
+        url = "%s?game_id=%s&first=%d" % (
+            TWITCH_STREAM_API_URL,
+            urllib.parse.quote(game_id),
+            TWITCH_API_PAGE_SIZE,
+        )
+        cursor = None
+
+        while True:
+            response_json = self.make_http_request(
+                url
+                if cursor is None
+                else url + "&" + urllib.parse.urlencode({"after": cursor})
+            ).json()
+
+            for stream_data in response_json["data"]:
+                if stream_data["viewer_count"] < min_viewers:
+                    return
+
+                yield self.parse_stream_data(stream_data)
+
+            cursor = response_json.get("pagination", {}).get("cursor")
+
+            if not response_json["data"] or not cursor:
+                return
+
+    def get_game_ids(self, games):
+        """Looks up the IDs of games given by name or ID.
+
+        Arg:
+            games: A list of strings each containing either a game's
+                name or its ID.
+
+        Returns:
+            A dictionary where the keys are the strings from games which
+            matched a game, and the values are tuples containing the
+            game's ID and name.
+        """
+        game_ids = {}
+
+        for start in range(0, len(games), TWITCH_API_PAGE_SIZE // 2):
+            chunk = games[start : start + TWITCH_API_PAGE_SIZE // 2]
+
+            # Each string could be either a name or an ID, so ask for
+            # both
+            query = urllib.parse.urlencode(
+                [("name", game) for game in chunk]
+                + [("id", game) for game in chunk if game.isdigit()]
+            )
+            response = self.make_http_request(
+                TWITCH_GAME_API_URL + "?" + query
+            )
+
+            for game_data in response.json()["data"]:
+                for game in chunk:
+                    if game in (game_data["id"], game_data["name"]):
+                        game_ids[game] = (game_data["id"], game_data["name"])
+
+        return game_ids
+
+    def get_profile_image_urls(self, streamer_logins):
+        """Looks up the profile image URLs of streamers.
+
+        These are for notification icons, so the requests aren't counted
+        in request_count.
+
+        Arg:
+            streamer_logins: A list of strings containing the login
+                names of the streamers.
+
+        Returns:
+            A dictionary where the keys are the (lowercase) login names
+            of the streamers found which have a profile image, and the
+            values are strings containing the image URLs.
+        """
+        image_urls = {}
+
+        for start in range(0, len(streamer_logins), TWITCH_API_PAGE_SIZE):
+            chunk = streamer_logins[start : start + TWITCH_API_PAGE_SIZE]
+            response = self.make_http_request(
+                TWITCH_USER_API_URL
+                + "?"
+                + urllib.parse.urlencode([("login", s) for s in chunk]),
+                counted=False,
+            )
+
+            for user_data in response.json()["data"]:
+                if user_data["profile_image_url"]:
+                    image_urls[user_data["login"].lower()] = user_data[
+                        "profile_image_url"
+                    ]
+
+        return image_urls
+
+    def get_box_art_urls(self, game_ids, width, height):
+        """Looks up the box art URLs of games.
+
+        These are for notification icons, so the requests aren't counted
+        in request_count.
+
+        Args:
+            game_ids: A list of strings containing the IDs of the games.
+            width: An integer containing the width of box art to get.
+            height: An integer containing the height of box art to get.
+
+        Returns:
+            A dictionary where the keys are the IDs of the games found,
+            and the values are strings containing the box art URLs.
+        """
+        image_urls = {}
+
+        for start in range(0, len(game_ids), TWITCH_API_PAGE_SIZE):
+            chunk = game_ids[start : start + TWITCH_API_PAGE_SIZE]
+            response = self.make_http_request(
+                TWITCH_GAME_API_URL
+                + "?"
+                + urllib.parse.urlencode([("id", g) for g in chunk]),
+                counted=False,
+            )
+
+            # Box art URLs are templates with the size left out
+            for game_data in response.json()["data"]:
+                image_urls[game_data["id"]] = (
+                    game_data["box_art_url"]
+                    .replace("{width}", str(width))
+                    .replace("{height}", str(height))
+                )
+
+        return image_urls
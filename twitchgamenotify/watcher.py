@@ -0,0 +1,275 @@
+"""Contains a watcher for using twitch-game-notify as a library.
+
+A Watcher does everything the twitch-game-notify command does short of
+actually notifying anyone: it queries Twitch for the streamers and games
+in a config dictionary and hands out what happened as events, either to
+callbacks or through an async iterator. For example:
+
+    watcher = Watcher(config_dict)
+
+    async for event in watcher:
+        if isinstance(event, Notification):
+            print(event.user_display_name, "is streaming", event.game_name)
+
+Events are StreamTransitions (a streamer went live, went offline, or
+changed games) and Notifications (a stream passed the streamer's
+filters, or a stream of a watched game was found).
+"""
+
+import asyncio
+import collections
+import logging
+import threading
+import requests
+from twitchgamenotify import clock
+from twitchgamenotify.configuration import validate_config
+from twitchgamenotify.constants import CYCLE_DEADLINE
+from twitchgamenotify.matching import compile_streamer_filters
+from twitchgamenotify.notifications import (
+    get_watched_games,
+    process_notifications,
+)
+from twitchgamenotify.trace import TRACE
+from twitchgamenotify.twitch_api import FailedHttpRequest, TwitchApi
+
+
+class Watcher:
+    """Watches streamers and games, producing events about their streams."""
+
+    def __init__(
+        self, config_dict, session=None, tracing=False, notify_errors=False
+    ):
+        """Validate the config and set up state.
+
+        Nothing is requested from Twitch until the first poll.
+
+        Args:
+            config_dict: A dictionary containing settings, in the same
+                form as a config file.
+            session: An optional requests.Session to make every HTTP
+                request with. Defaults to a new requests.Session.
+            tracing: An optional boolean specifying whether to turn on
+                tracing (see the trace module), which also dumps the
+                trace to the trace directory after failed requests.
+                Tracing is process-wide. Defaults to False, which
+                leaves tracing as it is (off, unless something else
+                turned it on).
+            notify_errors: An optional boolean specifying whether to
+                show errors querying Twitch as desktop notifications
+                over D-Bus (which needs notify2). Defaults to False,
+                which only logs them.
+
+        Raises:
+            ConfigFileInvalid: The config wasn't valid.
+        """
+        self.config = validate_config(config_dict)
+
+        if tracing:
+            TRACE.enabled = True
+        self.notify_errors = notify_errors
+        self.session = session
+        self.twitch_api = None
+
+        self.streamers = compile_streamer_filters(
+            self.config["streamers"],
+            include_title=self.config.get("include-title", []),
+            exclude_title=self.config.get("exclude-title", []),
+        )
+        self.games = None
+
+        # What was seen last poll, so only changes make events
+        self._streamers_previous_game = dict.fromkeys(self.streamers, "")
+        self._streamers_previous_title_match = dict.fromkeys(
+            self.streamers, False
+        )
+        self._games_state = {}
+
+        # Where to pick up querying streamers next poll
+        self._streamers_order = collections.deque(self.streamers)
+
+        # Only one poll happens at a time
+        self._poll_lock = threading.Lock()
+
+        self._callbacks = []
+        self._callbacks_lock = threading.Lock()
+
+        # The background thread, and the event telling it to stop. Each
+        # thread gets its own event, so one told to stop stays stopped.
+        self._thread = None
+        self._stop_event = None
+
+        # How many event iterators are open, and whether one of them
+        # started the background thread
+        self._iterators = 0
+        self._started_by_iterator = False
+
+    def add_callback(self, callback):
+        """Call a function with each event from now on.
+
+        Callbacks are called from whichever thread is polling, once
+        each poll is done.
+
+        Arg:
+            callback: A function taking a StreamTransition or
+                Notification.
+        """
+        with self._callbacks_lock:
+            self._callbacks.append(callback)
+
+    def remove_callback(self, callback):
+        """Stop calling a function added with add_callback."""
+        with self._callbacks_lock:
+            self._callbacks.remove(callback)
+
+    def poll(self):
+        """Query Twitch once and hand out the events that come of it.
+
+        Returns:
+            A list of the StreamTransitions and Notifications made, in
+            order.
+
+        Raises:
+            FailedHttpRequest: Connecting to Twitch or looking up the
+                watched games failed.
+            requests.exceptions.RequestException: Connecting to Twitch
+                failed.
+        """
+        events = []
+
+        with self._poll_lock:
+            if self.twitch_api is None:
+                self._connect()
+
+            process_notifications(
+                self.streamers,
+                self.twitch_api,
+                sinks=None,
+                ignore_502s=self.config["ignore-502-errors-persistant"],
+                streamers_previous_game=self._streamers_previous_game,
+                print_to_terminal=not self.notify_errors,
+                streamers_previous_title_match=(
+                    self._streamers_previous_title_match
+                ),
+                games=self.games,
+                games_state=self._games_state,
+                deadline=clock.monotonic()
+                + self.config.get("cycle-deadline", CYCLE_DEADLINE),
+                events_callback=events.append,
+                streamers_order=self._streamers_order,
+            )
+
+        with self._callbacks_lock:
+            callbacks = list(self._callbacks)
+
+        for event in events:
+            for callback in callbacks:
+                try:
+                    callback(event)
+                except Exception:  # pylint: disable=broad-except
+                    logging.exception("Watcher callback failed")
+
+        return events
+
+    def start(self):
+        """Poll every query period in a background thread."""
+        if self._thread is not None:
+            return
+
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, args=(self._stop_event,), daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """Stop polling in the background.
+
+        Arg:
+            timeout: An optional number containing how many seconds to
+                wait for a poll in progress to finish. Defaults to None,
+                which waits as long as it takes.
+        """
+        if self._thread is None:
+            return
+
+        self._stop_event.set()
+        self._thread.join(timeout)
+        self._thread = None
+        self._started_by_iterator = False
+
+    async def events(self):
+        """Iterate over events as they happen.
+
+        The watcher is started (see start) if it isn't running already,
+        in which case it's stopped again once every iterator is closed.
+
+        Yields:
+            StreamTransitions and Notifications.
+        """
+        loop = asyncio.get_running_loop()
+        event_queue = asyncio.Queue()
+
+        def callback(event):
+            try:
+                loop.call_soon_threadsafe(event_queue.put_nowait, event)
+            except RuntimeError:
+                # The event loop has been closed
+                pass
+
+        self.add_callback(callback)
+
+        with self._callbacks_lock:
+            self._iterators += 1
+
+            if self._thread is None:
+                self._started_by_iterator = True
+                self.start()
+
+        try:
+            while True:
+                yield await event_queue.get()
+        finally:
+            self.remove_callback(callback)
+
+            with self._callbacks_lock:
+                self._iterators -= 1
+                stop = not self._iterators and self._started_by_iterator
+
+                if stop:
+                    self._started_by_iterator = False
+
+            # Don't hold up the event loop waiting for a poll to finish
+            if stop:
+                self.stop(timeout=0)
+
+    def __aiter__(self):
+        """Iterate over events as they happen (see events)."""
+        return self.events()
+
+    def _connect(self):
+        """Authenticate with Twitch and look up the watched games."""
+        twitch_api = TwitchApi(
+            client_id=self.config["twitch-api-client-id"],
+            client_secret=self.config["twitch-api-client-secret"],
+            session=self.session,
+        )
+
+        self.games = get_watched_games(twitch_api, self.config["games"])
+        self.twitch_api = twitch_api
+
+    def _run(self, stop_event):
+        """Poll every query period until told to stop.
+
+        Arg:
+            stop_event: A threading.Event which is set to stop.
+        """
+        while not stop_event.is_set():
+            try:
+                self.poll()
+            except (
+                FailedHttpRequest,
+                requests.exceptions.RequestException,
+            ) as e:
+                logging.error("Unable to query Twitch: %s", e)
+
+            stop_event.wait(self.config["query-period"])